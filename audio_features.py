@@ -0,0 +1,271 @@
+"""
+Audio Feature Extraction
+Offline analysis of the audio files in the library: tempo, spectral centroid,
+RMS loudness, zero-crossing rate and an estimated key per track. Tracks are
+decoded and analysed in a process pool, and results are cached on disk keyed
+by path + mtime + size, so a rerun only touches files that changed.
+
+Run `python audio_features.py` to analyse the library in music_data.json.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from storage import write_json_atomic
+
+FEATURE_CACHE_FILE = "music_features.json"
+FEATURE_CACHE_VERSION = 1
+ANALYSIS_SAMPLE_RATE = 22050  # Audio di-decode mono pada rate ini (cukup untuk tempo & spektrum)
+MAX_ANALYSIS_SECONDS = 90  # Hanya bagian tengah lagu sepanjang ini yang dianalisis
+FRAME_SIZE = 2048
+HOP_SIZE = 512
+CACHE_SAVE_EVERY = 50  # Cache ditulis ke disk setiap sekian file selesai (aman jika dihentikan)
+
+KEY_NAMES = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+# Profil kunci Krumhansl-Kessler (mayor, minor) mulai dari tonika
+_MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+_MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+
+# --- Analisis (berjalan di proses worker) ---
+def _init_worker():
+    # Worker hanya men-decode, tidak memutar: tidak perlu perangkat audio sungguhan
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import pygame
+    pygame.mixer.init(frequency=ANALYSIS_SAMPLE_RATE, size=-16, channels=1)
+
+
+def decode_mono(path: str):
+    """Decode an audio file to float32 mono samples in [-1, 1] at the mixer's rate."""
+    import pygame
+    sound = pygame.mixer.Sound(path)
+    samples = pygame.sndarray.array(sound).astype(np.float32) / 32768.0
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    rate = pygame.mixer.get_init()[0]
+    return samples, rate
+
+
+def analyse_samples(samples, rate: int) -> dict:
+    """Feature dictionary for mono float samples."""
+    max_samples = MAX_ANALYSIS_SECONDS * rate
+    if len(samples) > max_samples:
+        start = (len(samples) - max_samples) // 2
+        samples = samples[start:start + max_samples]
+    if len(samples) < FRAME_SIZE:
+        samples = np.pad(samples, (0, FRAME_SIZE - len(samples)))
+
+    rms = float(np.sqrt(np.mean(samples ** 2)))
+    zero_crossing_rate = float(np.mean(np.abs(np.diff(np.signbit(samples).astype(np.int8)))))
+
+    # Spektrum per frame (STFT) dalam satu operasi array
+    frame_count = 1 + (len(samples) - FRAME_SIZE) // HOP_SIZE
+    offsets = np.arange(FRAME_SIZE)[None, :] + HOP_SIZE * np.arange(frame_count)[:, None]
+    frames = samples[offsets] * np.hanning(FRAME_SIZE)
+    magnitude = np.abs(np.fft.rfft(frames, axis=1))
+    freqs = np.fft.rfftfreq(FRAME_SIZE, 1.0 / rate)
+
+    energy = magnitude.sum(axis=1)
+    voiced = energy > 1e-6
+    centroid = float(np.mean((magnitude[voiced] @ freqs) / energy[voiced])) if voiced.any() else 0.0
+
+    return {
+        'tempo': _estimate_tempo(magnitude, rate),
+        'spectral_centroid': centroid,
+        'rms_db': 20.0 * np.log10(max(rms, 1e-9)),
+        'zero_crossing_rate': zero_crossing_rate,
+        **_estimate_key(magnitude, freqs),
+    }
+
+
+def _estimate_tempo(magnitude, rate: int) -> float:
+    """BPM from the autocorrelation of the spectral-flux onset envelope (60-200 BPM)."""
+    flux = np.maximum(np.diff(magnitude, axis=0), 0.0).sum(axis=1)
+    if len(flux) < 4 or not flux.any():
+        return 0.0
+    flux -= flux.mean()
+    autocorr = np.correlate(flux, flux, mode='full')[len(flux) - 1:]
+    frames_per_second = rate / HOP_SIZE
+    min_lag = int(frames_per_second * 60 / 200)
+    max_lag = min(int(frames_per_second * 60 / 60), len(autocorr) - 1)
+    if max_lag <= min_lag:
+        return 0.0
+    lag = min_lag + int(np.argmax(autocorr[min_lag:max_lag + 1]))
+    return 60.0 * frames_per_second / lag
+
+
+def _estimate_key(magnitude, freqs) -> dict:
+    """Key (0 = C .. 11 = B) and mode from a chroma profile matched against Krumhansl-Kessler."""
+    audible = (freqs >= 55.0) & (freqs <= 5000.0)
+    pitch_class = np.round(12 * np.log2(freqs[audible] / 440.0)).astype(int) % 12
+    pitch_class = (pitch_class + 9) % 12  # A = 9 jika C = 0
+    chroma = np.bincount(pitch_class, weights=magnitude[:, audible].sum(axis=0), minlength=12)
+    if not chroma.any():
+        return {'key': 0, 'mode': 'major', 'key_confidence': 0.0}
+    best = (-2.0, 0, 'major')
+    for tonic in range(12):
+        rotated = np.roll(chroma, -tonic)
+        for mode, profile in (('major', _MAJOR_PROFILE), ('minor', _MINOR_PROFILE)):
+            score = float(np.corrcoef(rotated, profile)[0, 1])
+            if score > best[0]:
+                best = (score, tonic, mode)
+    return {'key': best[1], 'mode': best[2], 'key_confidence': best[0]}
+
+
+def analyse_file(path: str) -> dict:
+    samples, rate = decode_mono(path)
+    features = analyse_samples(samples, rate)
+    features['analysed_seconds'] = min(len(samples) / rate, MAX_ANALYSIS_SECONDS)
+    return features
+
+
+def feature_vector(features: dict) -> list:
+    """
+    Fixed-length vector (similarity.AUDIO_FEATURE_DIM) for cosine similarity.
+    Each value is centred on a typical track so that "average" is near zero;
+    the key sits on the circle of fifths, so neighbouring keys point the same way.
+    """
+    fifths = (features['key'] * 7) % 12 * (2 * np.pi / 12)
+    return [
+        (features['tempo'] - 120.0) / 40.0,
+        (features['spectral_centroid'] - 2000.0) / 1000.0,
+        (features['rms_db'] + 18.0) / 6.0,
+        (features['zero_crossing_rate'] - 0.08) / 0.05,
+        float(np.cos(fifths)) * features['key_confidence'],
+        float(np.sin(fifths)) * features['key_confidence'],
+        0.5 if features['mode'] == 'major' else -0.5,
+        0.0,  # Cadangan agar panjang tetap sama dengan AUDIO_FEATURE_DIM
+    ]
+
+
+# --- Cache ---
+class FeatureCache:
+    """Path -> {'mtime', 'size', 'features'} stored as one JSON file."""
+
+    def __init__(self, path: str = FEATURE_CACHE_FILE):
+        self.path = path
+        self._entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                if data.get('version') == FEATURE_CACHE_VERSION:
+                    self._entries = data.get('files', {})
+            except (OSError, ValueError) as e:
+                print(f"Cache fitur audio tidak bisa dibaca: {e}")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, file_path: str, stat=None):
+        """Cached features for the file, or None if missing or the file changed since."""
+        entry = self._entries.get(file_path)
+        if entry is None:
+            return None
+        if stat is not None and (entry['mtime'] != stat.st_mtime or entry['size'] != stat.st_size):
+            return None
+        return entry['features']
+
+    def put(self, file_path: str, stat, features: dict):
+        self._entries[file_path] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'features': features}
+
+    def save(self):
+        write_json_atomic(self.path, {'version': FEATURE_CACHE_VERSION, 'files': self._entries}, indent=None)
+
+
+# --- Pipeline ---
+def extract_features(songs, cache: FeatureCache, workers: int = None, progress=None) -> dict:
+    """
+    Analyse every song whose file is new or changed since it was cached.
+    Returns {song_id: features} for the songs that were (re)analysed.
+    `progress(done, total, elapsed_seconds)` is called after each file.
+    """
+    jobs = {}  # file_path -> (stat, [song_id, ...]); satu file bisa dipakai beberapa lagu
+    for song in songs:
+        path = song.file_path
+        if not path:
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if path in jobs:
+            jobs[path][1].append(song.song_id)
+        elif cache.get(path, stat) is None:
+            jobs[path] = (stat, [song.song_id])
+
+    results = {}
+    total = len(jobs)
+    if not total:
+        print("Fitur audio sudah up to date.")
+        return results
+
+    print(f"Menganalisis {total} file audio...")
+    started = time.monotonic()
+    done = failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {pool.submit(analyse_file, path): path for path in jobs}
+        for future in as_completed(futures):
+            path = futures[future]
+            stat, song_ids = jobs[path]
+            done += 1
+            try:
+                features = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Gagal menganalisis {path}: {e}")
+            else:
+                cache.put(path, stat, features)
+                for song_id in song_ids:
+                    results[song_id] = features
+            if done % CACHE_SAVE_EVERY == 0:
+                cache.save()
+            if progress is not None:
+                progress(done, total, time.monotonic() - started)
+    cache.save()
+
+    elapsed = time.monotonic() - started
+    print(f"Selesai: {done - failed}/{total} file dalam {elapsed:.1f} detik "
+          f"({done / elapsed if elapsed else 0.0:.1f} file/detik), {failed} gagal.")
+    return results
+
+
+def cached_features(songs, cache: FeatureCache) -> dict:
+    """{song_id: features} for songs already in the cache (no stat, no decoding)."""
+    results = {}
+    for song in songs:
+        features = cache.get(song.file_path) if song.file_path else None
+        if features is not None:
+            results[song.song_id] = features
+    return results
+
+
+def _print_progress(done: int, total: int, elapsed: float):
+    rate = done / elapsed if elapsed else 0.0
+    remaining = (total - done) / rate if rate else 0.0
+    print(f"  {done}/{total} ({rate:.1f} file/detik, sisa ~{remaining:.0f} detik)")
+
+
+def main():
+    from backend import DATA_FILE, STORAGE_BACKEND, Song
+    from storage import create_storage
+
+    storage = create_storage(STORAGE_BACKEND, DATA_FILE)
+    try:
+        data = storage.load()
+    finally:
+        storage.close()
+    songs = [Song(song_id, details.get('title'), details.get('artist'), details.get('album'),
+                  details.get('genre'), details.get('duration_seconds'), details.get('file_path'),
+                  details.get('image_path'))
+             for song_id, details in data.get('songs', {}).items()]
+    extract_features(songs, FeatureCache(), progress=_print_progress)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Search Autocomplete
+Prefix completions over song titles, artists and albums, ranked by how often
+the songs behind each completion have been played.
+"""
+
+import heapq
+from bisect import bisect_left, insort
+
+from search_index import normalize
+
+MAX_SUGGESTIONS = 8  # Panjang maksimal daftar saran
+TOP_DEPTH = 16  # Frasa yang disimpan per prefix lebar; cadangan agar penghapusan jarang memicu scan ulang
+CACHE_MIN_RANGE = 256  # Prefix dengan frasa sebanyak ini atau lebih punya daftar teratas yang dijaga
+COMPLETION_FIELDS = ('title', 'artist', 'album')
+_RANGE_END = "\U0010ffff"
+
+
+class Completion:
+    """One completion phrase: its display text, weight (total plays) and how many songs carry it."""
+
+    __slots__ = ('text', 'weight', 'refs')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.weight = 0
+        self.refs = 0
+
+
+def _prefixes(key: str):
+    return (key[:length] for length in range(1, len(key) + 1))
+
+
+class AutocompleteIndex:
+    """
+    Weighted prefix completion over titles, artists and albums.
+
+    Phrases are kept normalised (casefolded, no diacritics) in a sorted array,
+    so a prefix is a bisect range. Every wide prefix (CACHE_MIN_RANGE phrases
+    or more) has a precomputed ranked list, built in one pass on the first
+    query and then maintained in place: a phrase that gains weight or appears
+    is folded in, one that loses weight or disappears is moved down or dropped.
+    Each list is the exact top of its range and keeps TOP_DEPTH entries, so a
+    drop rarely leaves it shorter than MAX_SUGGESTIONS; only then is that one
+    range scanned again. Narrow ranges are ranked on the spot, so a keystroke
+    costs a lookup or a scan of fewer than CACHE_MIN_RANGE phrases, whatever
+    the library size.
+    """
+
+    def __init__(self, max_suggestions: int = MAX_SUGGESTIONS, normalized=None):
+        self.max_suggestions = max_suggestions
+        self.depth = max(TOP_DEPTH, max_suggestions)
+        # (song_id, field) -> teks ternormalisasi yang sudah ada (mis. SearchIndex.normalized);
+        # tanpa ini setiap field dinormalisasi sendiri
+        self._normalized = normalized
+        self._entries = {}  # frasa ternormalisasi -> Completion
+        self._keys = None  # Frasa terurut untuk bisect (None = belum dibangun)
+        self._keys_of = {}  # song_id -> tuple frasa yang disumbangkan lagu itu
+        self._plays_of = {}  # song_id -> jumlah putar
+        self._top = {}  # prefix lebar -> frasa teratas (skor tertinggi dulu), dibangun bersama _keys
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --- Mutasi ---
+    def add(self, song, play_count: int = 0):
+        if song.song_id in self._keys_of:
+            self.update(song)
+            return
+        self._plays_of[song.song_id] = play_count
+        keys = self._song_keys(song)
+        for key, text in keys:
+            self._add_ref(key, text, play_count)
+        self._keys_of[song.song_id] = tuple(key for key, _ in keys)
+
+    def update(self, song):
+        old_keys = self._keys_of.get(song.song_id)
+        if old_keys is None:
+            self.add(song)
+            return
+        # Hanya frasa yang berubah yang disentuh (mengubah genre atau gambar tidak mengubah apa pun)
+        play_count = self._plays_of.get(song.song_id, 0)
+        keys = self._song_keys(song)
+        new_keys = tuple(key for key, _ in keys)
+        for key in old_keys:
+            if key not in new_keys:
+                self._drop_ref(key, play_count)
+        for key, text in keys:
+            if key not in old_keys:
+                self._add_ref(key, text, play_count)
+        self._keys_of[song.song_id] = new_keys
+
+    def remove(self, song_id: str):
+        keys = self._keys_of.pop(song_id, None)
+        if keys is None:
+            return
+        play_count = self._plays_of.pop(song_id, 0)
+        for key in keys:
+            self._drop_ref(key, play_count)
+
+    def record_play(self, song_id: str, count: int = 1):
+        """Add `count` plays of a song (negative to take them back) to every phrase it carries."""
+        keys = self._keys_of.get(song_id)
+        if keys is None or not count:
+            return
+        self._plays_of[song_id] = self._plays_of.get(song_id, 0) + count
+        for key in keys:
+            self._entries[key].weight += count
+            if count > 0:
+                self._raise(key)
+            else:
+                self._lower(key, removed=False)
+
+    # --- Query ---
+    def suggest(self, prefix: str, limit: int = None) -> list:
+        """Up to `limit` completion texts for `prefix`, most played first (ties alphabetical)."""
+        limit = self.max_suggestions if limit is None else min(limit, self.max_suggestions)
+        prefix = normalize(prefix).lstrip()
+        if not prefix or limit <= 0:
+            return []
+        if self._keys is None:
+            self._build()
+        ranked = self._top.get(prefix)
+        if ranked is None:
+            start, end = self._range(prefix)
+            ranked = self._scan(start, end, limit)
+        return [self._entries[key].text for key in ranked[:limit]]
+
+    # --- Helper internal ---
+    def _song_keys(self, song) -> list:
+        """[(normalised phrase, display text), ...] for the song's completion fields, without repeats."""
+        keys = []
+        for field in COMPLETION_FIELDS:
+            text = getattr(song, field)
+            if self._normalized is not None:
+                key = self._normalized(song.song_id, field).strip()
+            else:
+                key = normalize(text).strip()
+            if key and all(key != other for other, _ in keys):
+                keys.append((key, text.strip()))
+        return keys
+
+    def _rank_key(self, key: str):
+        return -self._entries[key].weight, key
+
+    def _range(self, prefix: str):
+        start = bisect_left(self._keys, prefix)
+        return start, bisect_left(self._keys, prefix + _RANGE_END, start)
+
+    def _scan(self, start: int, end: int, count: int) -> list:
+        return heapq.nsmallest(count, self._keys[start:end], key=self._rank_key)
+
+    def _insert_ranked(self, ranked: list, key: str):
+        rank = self._rank_key(key)
+        ranked.insert(bisect_left([self._rank_key(other) for other in ranked], rank), key)
+
+    def _build(self):
+        """Sort the phrases and rank every wide prefix, one prefix length at a time inside the wide ranges."""
+        keys = self._keys = sorted(self._entries)
+        self._top = {}
+        wide = [(0, len(keys))]
+        length = 1
+        while wide:
+            narrower = []
+            for start, end in wide:
+                i = start
+                while i < end:
+                    if len(keys[i]) < length:
+                        i += 1  # Frasa ini sama dengan prefix induknya
+                        continue
+                    prefix = keys[i][:length]
+                    j = bisect_left(keys, prefix + _RANGE_END, i, end)
+                    if j - i >= CACHE_MIN_RANGE:
+                        self._top[prefix] = self._scan(i, j, self.depth)
+                        narrower.append((i, j))
+                    i = j
+            wide = narrower
+            length += 1
+
+    def _add_ref(self, key: str, text: str, play_count: int):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = Completion(text)
+            if self._keys is not None:
+                insort(self._keys, key)
+        entry.refs += 1
+        entry.weight += play_count
+        self._raise(key)
+
+    def _drop_ref(self, key: str, play_count: int):
+        entry = self._entries[key]
+        entry.refs -= 1
+        entry.weight -= play_count
+        removed = entry.refs <= 0
+        if removed and self._keys is not None:
+            pos = bisect_left(self._keys, key)
+            if pos < len(self._keys) and self._keys[pos] == key:
+                del self._keys[pos]
+        if play_count or removed:
+            self._lower(key, removed)
+        if removed:
+            del self._entries[key]
+
+    def _raise(self, key: str):
+        """A phrase gained weight or is new: fold it into the lists of its wide prefixes."""
+        if self._keys is None:
+            return
+        rank = self._rank_key(key)
+        for prefix in _prefixes(key):
+            ranked = self._top.get(prefix)
+            if ranked is None:
+                # Prefix ini bisa baru saja menjadi lebar; yang lebih panjang pasti lebih sempit
+                start, end = self._range(prefix)
+                if end - start < CACHE_MIN_RANGE:
+                    break
+                self._top[prefix] = self._scan(start, end, self.depth)
+                continue
+            if key in ranked:
+                ranked.remove(key)
+            elif ranked and rank > self._rank_key(ranked[-1]):
+                # Di bawah ekor hanya boleh masuk jika semua frasa lain di rentang ini sudah ada di daftar
+                start, end = self._range(prefix)
+                if len(ranked) >= self.depth or end - start - 1 > len(ranked):
+                    continue
+            self._insert_ranked(ranked, key)
+            del ranked[self.depth:]
+
+    def _lower(self, key: str, removed: bool):
+        """A phrase lost weight or is gone: move it down, or out if unlisted phrases may now outrank it."""
+        if self._keys is None:
+            return
+        for prefix in _prefixes(key):
+            ranked = self._top.get(prefix)
+            if ranked is None:
+                break
+            if key not in ranked:
+                continue
+            start, end = self._range(prefix)
+            complete = end - start == len(ranked) - removed  # Daftar memuat seluruh rentang
+            tail = ranked[-1]
+            ranked.remove(key)
+            if not removed and (complete or (key != tail and self._rank_key(key) < self._rank_key(tail))):
+                # Masih di atas semua frasa di luar daftar, jadi posisinya diketahui
+                self._insert_ranked(ranked, key)
+            elif not complete and len(ranked) < self.max_suggestions:
+                ranked[:] = self._scan(start, end, self.depth)
+            if start == end:
+                del self._top[prefix]
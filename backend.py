@@ -1,32 +1,93 @@
 # Simpan file ini sebagai backend.py
 
-import time
 import random
+import functools
+import contextlib
+import io
+import itertools
 from collections import deque
 import pygame
-import json
 import os
 import threading
 import syncedlyrics
+from storage import create_storage, storage_dir, DEFAULT_USERNAME, FAVOURITES_NAME
+from search_index import SearchIndex, FieldIndex, RangeIndex, field_key
+import query_parser
+from query_cache import QueryCache
+from autocomplete import AutocompleteIndex
+from similarity import SimilarityEngine, NUMPY_AVAILABLE
+from song_table import SongTable
+from knn_graph import KnnGraph, library_fingerprint
+from play_history import PlayHistory
+from playback_clock import PlaybackClock
+if NUMPY_AVAILABLE:
+    import audio_features
 
 DATA_FILE = "music_data.json"
+PLAY_HISTORY_FILE = "music_plays.json"  # Matriks transisi lagu -> lagu berikutnya (+ log .log)
+KNN_FILE = "music_knn.json"  # Graf lagu mirip (top-k tetangga per lagu), dibangun ulang jika library berubah
+STORAGE_BACKEND = "journal"  # "journal" (JSON + journal), "json" (write-behind) atau "sqlite"
+JOURNAL_COMPACT_THRESHOLD = 500  # Jumlah record journal sebelum dilipat ke snapshot
+SAVE_QUIET_PERIOD = 1.0  # Detik tanpa perubahan sebelum saver "json" menulis ke disk
+TRACK_END_EVENT = pygame.USEREVENT + 1  # Dikirim mixer saat lagu habis atau lagu antrean mulai
+QUERY_CACHE_SIZE = 256  # Jumlah hasil query (search/genre) yang disimpan di cache LRU
+SIMILAR_NEIGHBOURS = 10  # Jumlah tetangga terdekat yang dipertimbangkan untuk next/prev di library
+MIN_SIMILARITY = 0.15  # Skor cosine minimal; durasi mirip saja (~0.09) tidak dianggap lagu mirip
+AUDIO_REBUILD_THRESHOLD = 100  # Di atas jumlah lagu berfitur baru ini, graf kNN dibangun ulang, bukan diperbarui per lagu
+HISTORY_WEIGHT = 1.0  # Bobot "biasanya diputar setelah lagu ini" relatif terhadap skor kemiripan
+USE_SONG_TABLE = True  # Tabel kolom (NumPy) untuk menyaring kandidat query genre:/duration: jika NumPy tersedia
+
+
+def _mutation(method):
+    """Dekorator: mutasi model berjalan di bawah state lock agar saver di background membaca state yang konsisten."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._state_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _library_mutation(method):
+    """Dekorator: seperti _mutation, dan menaikkan generasi library agar hasil query di cache kedaluwarsa."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._state_lock:
+            self._library_generation += 1
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+# Tabel string bersama: artis/album/genre yang sama dipakai ulang oleh semua Song
+_METADATA_STRINGS = {}
+
+
+def intern_metadata(value):
+    """Mengembalikan satu objek string bersama untuk nilai metadata yang sama."""
+    if not isinstance(value, str):
+        return value
+    return _METADATA_STRINGS.setdefault(value, value)
 
 
 # ==============================================================================
 # KELAS 1: SONG (Tipe Data Record)
 # ==============================================================================
 class Song:
+    # __slots__: tanpa __dict__ per objek, jauh lebih hemat memori untuk library besar
+    __slots__ = ('song_id', 'title', 'artist', 'album', 'genre', 'duration_seconds', 'file_path',
+                 'image_path', 'playlist_nodes')
+
     def __init__(self, song_id, title, artist, album, genre, duration_seconds, file_path,
                  image_path):
         self.song_id = song_id
         self.title = title
-        self.artist = artist
-        self.album = album
-        self.genre = genre
+        self.artist = intern_metadata(artist)
+        self.album = intern_metadata(album)
+        self.genre = intern_metadata(genre)
         self.duration_seconds = duration_seconds
         self.file_path = file_path
         self.image_path = image_path
-        self.playlist_nodes = []
+        # Tuple kosong bersama; list baru dibuat saat lagu pertama kali masuk playlist
+        self.playlist_nodes = ()
 
     def __str__(self):
         mins = self.duration_seconds // 60
@@ -35,21 +96,116 @@ class Song:
 
     def update_details(self, title, artist, album, genre, image_path):
         self.title = title
-        self.artist = artist
-        self.album = album
-        self.genre = genre
+        self.artist = intern_metadata(artist)
+        self.album = intern_metadata(album)
+        self.genre = intern_metadata(genre)
         self.image_path = image_path
         print(f"Info lagu '{self.song_id}' telah diupdate.")
 
+    def _attach_node(self, node):
+        if not self.playlist_nodes:
+            self.playlist_nodes = [node]
+        else:
+            self.playlist_nodes.append(node)
+
+    def _detach_node(self, node):
+        if node in self.playlist_nodes:
+            self.playlist_nodes.remove(node)
+            if not self.playlist_nodes:
+                self.playlist_nodes = ()
+
 
 # ==============================================================================
 # KELAS 2 & 3: DATA STRUCTURE (Doubly Linked List)
 # ==============================================================================
 class Node:
-    def __init__(self, song_object):
+    __slots__ = ('song', 'next', 'prev', 'playlist', 'left', 'right', 'parent', 'priority', 'size')
+
+    def __init__(self, song_object, playlist=None):
         self.song = song_object
         self.next = None
         self.prev = None
+        self.playlist = playlist  # Back-reference ke DoublyLinkedList pemilik node
+        # Field treap implisit (indeks posisi), lihat fungsi _tree_* di bawah
+        self.left = None
+        self.right = None
+        self.parent = None
+        self.priority = random.random()
+        self.size = 1
+
+
+# --- Treap implisit: node yang sama juga tersusun sebagai pohon berdasarkan posisi ---
+# Memberi akses posisi O(log n) (song_at, index_of, move, pilih acak) tanpa mengubah
+# navigasi next/prev milik Doubly Linked List.
+def _tree_size(node):
+    return node.size if node else 0
+
+
+def _tree_update(node):
+    node.size = 1 + _tree_size(node.left) + _tree_size(node.right)
+
+
+def _tree_merge(a, b):
+    """Menggabungkan dua pohon (semua node a berada sebelum b). Parent akar hasil diatur pemanggil."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a.priority > b.priority:
+        a.right = _tree_merge(a.right, b)
+        a.right.parent = a
+        _tree_update(a)
+        return a
+    b.left = _tree_merge(a, b.left)
+    b.left.parent = b
+    _tree_update(b)
+    return b
+
+
+def _tree_split(node, k):
+    """Memecah pohon menjadi (k node pertama, sisanya)."""
+    if node is None:
+        return None, None
+    if _tree_size(node.left) >= k:
+        left, right = _tree_split(node.left, k)
+        node.left = right
+        if right:
+            right.parent = node
+        if left:
+            left.parent = None
+        _tree_update(node)
+        return left, node
+    left, right = _tree_split(node.right, k - _tree_size(node.left) - 1)
+    node.right = left
+    if left:
+        left.parent = node
+    if right:
+        right.parent = None
+    _tree_update(node)
+    return node, right
+
+
+def _tree_node_at(root, index):
+    node = root
+    while node:
+        left_size = _tree_size(node.left)
+        if index < left_size:
+            node = node.left
+        elif index == left_size:
+            return node
+        else:
+            index -= left_size + 1
+            node = node.right
+    return None
+
+
+def _tree_index_of(node):
+    index = _tree_size(node.left)
+    while node.parent:
+        if node.parent.right is node:
+            index += _tree_size(node.parent.left) + 1
+        node = node.parent
+    return index
 
 
 class DoublyLinkedList:
@@ -58,9 +214,19 @@ class DoublyLinkedList:
         self.head = None
         self.tail = None
         self.current_song_node = None
+        # Song -> list Node miliknya, urut sesuai posisi di playlist.
+        # Dipakai untuk cek keanggotaan, cari node, dan hapus dalam O(1).
+        self._nodes_by_song = {}
+        self._root = None  # Akar treap implisit atas node-node playlist
+
+    def contains(self, song_object):
+        return song_object in self._nodes_by_song
+
+    def length(self):
+        return _tree_size(self._root)
 
     def add_song(self, song_object):
-        new_node = Node(song_object)
+        new_node = Node(song_object, self)
         if self.head is None:
             self.head = new_node
             self.tail = new_node
@@ -68,33 +234,76 @@ class DoublyLinkedList:
             self.tail.next = new_node
             new_node.prev = self.tail
             self.tail = new_node
-        song_object.playlist_nodes.append(new_node)
+        self._set_root(_tree_merge(self._root, new_node))
+        song_object._attach_node(new_node)
+        self._nodes_by_song.setdefault(song_object, []).append(new_node)
         print(f"'{song_object.title}' ditambahkan ke playlist '{self.name}'.")
 
-    def _remove_node(self, node_to_delete):
-        if node_to_delete is None: return
+    def _set_root(self, root):
+        self._root = root
+        if root:
+            root.parent = None
+
+    def _unlink(self, node):
+        """Melepas node dari rantai next/prev saja."""
+        if node == self.head: self.head = node.next
+        if node == self.tail: self.tail = node.prev
+        if node.prev: node.prev.next = node.next
+        if node.next: node.next.prev = node.prev
+        node.prev = node.next = None
+
+    def _tree_remove(self, node):
+        """Melepas node dari treap, O(log n)."""
+        replacement = _tree_merge(node.left, node.right)
+        parent = node.parent
+        if replacement:
+            replacement.parent = parent
+        if parent is None:
+            self._root = replacement
+        elif parent.left is node:
+            parent.left = replacement
+        else:
+            parent.right = replacement
+        while parent:
+            parent.size -= 1
+            parent = parent.parent
+        node.left = node.right = node.parent = None
+        node.size = 1
+
+    def _remove_node(self, node_to_delete, detach_from_song=True):
+        if node_to_delete is None or node_to_delete.playlist is not self: return
         if self.current_song_node == node_to_delete: self.current_song_node = None
-        if node_to_delete == self.head: self.head = node_to_delete.next
-        if node_to_delete == self.tail: self.tail = node_to_delete.prev
-        if node_to_delete.prev: node_to_delete.prev.next = node_to_delete.next
-        if node_to_delete.next: node_to_delete.next.prev = node_to_delete.prev
-        if node_to_delete in node_to_delete.song.playlist_nodes:
-            node_to_delete.song.playlist_nodes.remove(node_to_delete)
+        self._unlink(node_to_delete)
+        self._tree_remove(node_to_delete)
+        node_to_delete.playlist = None
+        if detach_from_song:
+            node_to_delete.song._detach_node(node_to_delete)
+        nodes = self._nodes_by_song.get(node_to_delete.song)
+        if nodes and node_to_delete in nodes:
+            nodes.remove(node_to_delete)
+            if not nodes:
+                del self._nodes_by_song[node_to_delete.song]
 
     def remove_song_by_user(self, song_object):
-        current = self.head
-        node_to_remove = None
-        while current:
-            if current.song == song_object:
-                node_to_remove = current
-                break
-            current = current.next
+        # Jika lagu muncul lebih dari sekali, yang dihapus adalah kemunculan pertama
+        node_to_remove = self.find_node_by_song(song_object)
         if node_to_remove:
             self._remove_node(node_to_remove)
             print(f"'{song_object.title}' telah dihapus dari playlist '{self.name}'.")
         else:
             print(f"'{song_object.title}' tidak ditemukan di playlist ini.")
 
+    def _detach_all(self):
+        """Melepas semua node dari Song-nya (dipanggil saat playlist dihapus)."""
+        current = self.head
+        while current:
+            current.song._detach_node(current)
+            current.playlist = None
+            current = current.next
+        self.head = self.tail = self.current_song_node = None
+        self._nodes_by_song = {}
+        self._root = None
+
     def view_songs(self):
         songs = []
         current = self.head
@@ -103,13 +312,87 @@ class DoublyLinkedList:
             current = current.next
         return songs
 
+    # --- Akses posisi (treap implisit) ---
+    def node_at(self, index):
+        if index < 0:
+            index += self.length()
+        if not 0 <= index < self.length():
+            raise IndexError(f"Posisi {index} di luar playlist '{self.name}'.")
+        return _tree_node_at(self._root, index)
+
+    def song_at(self, index):
+        """Lagu pada posisi ke-index, O(log n)."""
+        return self.node_at(index).song
+
+    def songs_slice(self, offset, limit=None, descending=False):
+        """Lagu di posisi offset..offset+limit (dari belakang jika descending), O(log n + limit)."""
+        total = self.length()
+        if offset >= total or limit == 0:
+            return []
+        count = total - offset if limit is None else min(limit, total - offset)
+        node = self.node_at(total - 1 - offset if descending else offset)
+        songs = []
+        while node and len(songs) < count:
+            songs.append(node.song)
+            node = node.prev if descending else node.next
+        return songs
+
+    def index_of_node(self, node):
+        if node is None or node.playlist is not self:
+            return None
+        return _tree_index_of(node)
+
+    def index_of(self, song_object):
+        """Posisi kemunculan pertama lagu, O(log n). None jika tidak ada."""
+        return self.index_of_node(self.find_node_by_song(song_object))
+
+    def move(self, from_index, to_index):
+        """Memindahkan lagu di from_index ke to_index (seperti list.insert(j, list.pop(i)))."""
+        node = self.node_at(from_index)
+        self._unlink(node)
+        self._tree_remove(node)
+        node.priority = random.random()
+
+        to_index = max(0, min(to_index, self.length()))
+        if to_index < self.length():
+            successor = _tree_node_at(self._root, to_index)
+            node.prev = successor.prev
+            node.next = successor
+            if successor.prev:
+                successor.prev.next = node
+            else:
+                self.head = node
+            successor.prev = node
+        else:
+            node.prev = self.tail
+            if self.tail:
+                self.tail.next = node
+            else:
+                self.head = node
+            self.tail = node
+
+        left, right = _tree_split(self._root, to_index)
+        self._set_root(_tree_merge(_tree_merge(left, node), right))
+
+        # Urutan kemunculan lagu ini bisa berubah, jaga agar tetap urut posisi
+        nodes = self._nodes_by_song.get(node.song)
+        if nodes and len(nodes) > 1:
+            nodes.sort(key=_tree_index_of)
+
+    def random_song(self):
+        """Lagu acak dari playlist, O(log n). None jika playlist kosong."""
+        if self._root is None:
+            return None
+        return _tree_node_at(self._root, random.randrange(self._root.size)).song
+
     def find_node_by_song(self, song_object):
-        current = self.head
-        while current:
-            if current.song == song_object:
-                return current
-            current = current.next
-        return None
+        """Node pertama (posisi paling awal) yang berisi lagu ini, atau None."""
+        nodes = self._nodes_by_song.get(song_object)
+        return nodes[0] if nodes else None
+
+    def find_nodes_by_song(self, song_object):
+        """Semua node yang berisi lagu ini, urut sesuai posisi."""
+        return list(self._nodes_by_song.get(song_object, ()))
 
     def play_from_playlist(self):
         if self.head:
@@ -141,110 +424,526 @@ class DoublyLinkedList:
 
 
 # ==============================================================================
-# KELAS 4: MUSIC PLAYER (Controller Utama)
+# KELAS 4: SHUFFLE ENGINE (Permutasi Fisher-Yates + Riwayat)
+# ==============================================================================
+class ShuffleEngine:
+    """
+    Urutan acak tanpa pengulangan untuk satu konteks (library atau playlist).
+    Permutasi dibuat sekali (Fisher-Yates) lalu dijalani satu per satu; lagu
+    yang ditambah/dihapus dari konteks dilipat masuk tanpa mengacak ulang.
+    Riwayat terbatas membuat "prev" kembali ke lagu sebelumnya dalam O(1).
+    """
+
+    def __init__(self, history_size=50):
+        self.context = None  # 'library' atau objek DoublyLinkedList
+        self._order = []  # Permutasi siklus saat ini
+        self._cursor = -1  # Indeks lagu terakhir yang diambil dari _order
+        self._removed = set()  # Lagu yang sudah keluar dari konteks (dilewati saat melangkah)
+        self._history = deque(maxlen=history_size)  # Lagu-lagu sebelumnya, untuk prev
+        self._forward = []  # Lagu yang "dibatalkan" oleh prev, diputar lagi oleh next
+        self._songs_provider = None
+
+    def reset(self, context, songs_provider, current_song=None):
+        """Mengikat engine ke konteks baru dan membuat permutasi pertama."""
+        self.context = context
+        self._songs_provider = songs_provider
+        self._history.clear()
+        self._forward = []
+        self._new_cycle(current_song)
+
+    def _new_cycle(self, current_song=None):
+        order = list(self._songs_provider())
+        # Fisher-Yates
+        for i in range(len(order) - 1, 0, -1):
+            j = random.randint(0, i)
+            order[i], order[j] = order[j], order[i]
+        self._removed = set()
+        self._cursor = -1
+        if current_song is not None and current_song in order:
+            # Lagu yang sedang diputar dianggap sudah dimainkan di siklus ini
+            order.remove(current_song)
+            order.insert(0, current_song)
+            self._cursor = 0
+        self._order = order
+
+    def next(self, current_song):
+        """Lagu berikutnya dalam permutasi; siklus baru dibuat setelah semua lagu terputar."""
+        while self._forward:
+            song = self._forward.pop()
+            if song not in self._removed:
+                self._push_history(current_song)
+                return song
+
+        song = self._advance()
+        if song is None:
+            self._next_cycle(current_song)
+            song = self._advance()
+        if song is not None:
+            self._push_history(current_song)
+        return song
+
+    def peek_next(self, current_song):
+        """Lagu yang akan dikembalikan next(current_song), tanpa melangkah."""
+        for song in reversed(self._forward):
+            if song not in self._removed:
+                return song
+        song = self._peek_order()
+        if song is None:
+            # Siklus habis: siklus baru disiapkan sekarang, next() akan langsung memakainya
+            self._next_cycle(current_song)
+            song = self._peek_order()
+        return song
+
+    def advance_to(self, song, current_song):
+        """
+        Seperti next(), tetapi melangkah tepat ke `song` (hasil peek_next yang sudah
+        diantrekan), walau sejak peek ada lagu yang dilipat masuk atau dikeluarkan.
+        """
+        for i in range(len(self._forward) - 1, -1, -1):
+            if self._forward[i] is song:
+                del self._forward[i]
+                self._push_history(current_song)
+                return song
+        try:
+            index = self._order.index(song, self._cursor + 1)
+        except ValueError:
+            index = None
+        # Lagu ini dipindah ke langkah berikutnya; sisa siklus tetap urutannya
+        self._order.insert(self._cursor + 1, song if index is None else self._order.pop(index))
+        self._cursor += 1
+        self._push_history(current_song)
+        return song
+
+    def prev(self, current_song):
+        """Lagu yang diputar sebelum current_song, atau None jika riwayat habis."""
+        while self._history:
+            song = self._history.pop()
+            if song not in self._removed:
+                if current_song is not None:
+                    self._forward.append(current_song)
+                return song
+        return None
+
+    def add(self, song):
+        """Menyisipkan lagu baru di posisi acak pada sisa siklus ini."""
+        if song in self._removed:
+            self._removed.discard(song)
+            return
+        position = random.randint(self._cursor + 1, len(self._order))
+        self._order.insert(position, song)
+
+    def remove(self, song):
+        self._removed.add(song)
+
+    def _next_cycle(self, current_song):
+        self._new_cycle()
+        # Hindari lagu yang sama diputar dua kali berturut-turut di batas siklus
+        if len(self._order) > 1 and self._order[0] is current_song:
+            self._order[0], self._order[-1] = self._order[-1], self._order[0]
+
+    def _peek_order(self):
+        for song in itertools.islice(self._order, self._cursor + 1, None):
+            if song not in self._removed:
+                return song
+        return None
+
+    def _advance(self):
+        while self._cursor + 1 < len(self._order):
+            self._cursor += 1
+            song = self._order[self._cursor]
+            if song not in self._removed:
+                return song
+        return None
+
+    def _push_history(self, song):
+        if song is not None:
+            self._history.append(song)
+
+
+# ==============================================================================
+# KELAS 5: MUSIC PLAYER (Controller Utama)
 # ==============================================================================
 class MusicPlayer:
-    def __init__(self):
+    def __init__(self, storage=None, play_history_path=None, knn_path=None):
         pygame.mixer.init()
+        self._end_events = self._init_end_event()
         self.song_library = {}
         self.user_playlists = {}
-        self.favourite_playlist = DoublyLinkedList("My Favourites")
+        self.favourite_playlist = DoublyLinkedList(FAVOURITES_NAME)
         self.is_shuffle = False
         self.repeat_mode = "none"
         self.current_song = None
         self.is_playing = False
         self.current_context = None
         self.recently_played_history = deque(maxlen=10)
-        self.current_seek_time = 0.0
-        self.start_time = 0.0  # Waktu saat tombol Play ditekan
-        self.pause_start_time = 0.0  # Waktu saat tombol Pause ditekan
-        self.username = "Mokhammad Bahauddin"
+        self.shuffle_engine = ShuffleEngine()
+        # Satu-satunya sumber posisi lagu (slider, lirik, visualizer), mengikuti mixer
+        self.clock = PlaybackClock(pygame.mixer.music.get_pos)
+        self.username = DEFAULT_USERNAME
         self.beat_times = []  # Dihapus dari versi ini
+        # Gapless: lagu berikutnya ditentukan lebih awal dan di-queue ke mixer
+        self._lookahead = None  # (song, context, commit) lagu berikutnya yang sudah ditentukan
+        self._queued = None  # Lookahead yang sudah diserahkan ke pygame.mixer.music.queue
+        self._queue_token = 0  # Naik setiap lookahead berganti; prefetch lama diabaikan
+        self._mixer_has_queue = False  # Mixer memegang antrean (bisa jadi sudah usang)
+        self._prefetched = None  # (song, bytes) file lagu berikutnya yang sudah dibaca ke memori
+        self._last_mixer_pos = 0
+        self._state_lock = threading.RLock()
+        self._batch_records = None  # List record yang ditahan selama batch() aktif
+        self._batch_undo = None  # Langkah pembatalan mutasi batch, dijalankan mundur saat rollback
+        self._batch_deferred = None  # Aksi di luar model (mis. riwayat putar) yang menunggu batch selesai
+        self._library_generation = 0  # Naik setiap kali isi library berubah
+        self.query_cache = QueryCache(QUERY_CACHE_SIZE)
+        self.knn_graph = None
+        self._knn_saved_fingerprint = None  # Fingerprint file graf kNN yang terakhir dimuat/disimpan
+        # Penyimpanan: journal, snapshot write-behind, atau SQLite (lihat STORAGE_BACKEND)
+        if storage is None:
+            options = {}
+            if STORAGE_BACKEND == "journal":
+                options = {'compact_threshold': JOURNAL_COMPACT_THRESHOLD}
+            elif STORAGE_BACKEND == "json":
+                options = {'quiet_period': SAVE_QUIET_PERIOD}
+            storage = create_storage(STORAGE_BACKEND, DATA_FILE, **options)
+        self.storage = storage
+        # Riwayat putar (lintas sesi; baru dibaca dari disk saat pertama kali dipakai) dan graf kNN
+        # disimpan di folder yang sama dengan data storage, kecuali path-nya diberikan
+        data_dir = storage_dir(storage)
+        self.play_history = PlayHistory(play_history_path or os.path.join(data_dir, PLAY_HISTORY_FILE))
+        self.knn_path = knn_path or os.path.join(data_dir, KNN_FILE)
+        self.storage.attach(self._build_snapshot)
         self.load_data()
 
     # --- FUNGSI SAVE/LOAD ---
     def load_data(self):
-        if not os.path.exists(DATA_FILE):
-            print("File data tidak ditemukan. Memulai dengan data kosong.")
-            return
         try:
-            with open(DATA_FILE, 'r') as f:
-                data = json.load(f)
-                self.username = data.get('username', 'Mokhammad Bahauddin')
-                songs_data = data.get('songs', {})
-                for song_id, details in songs_data.items():
-                    song = Song(
-                        song_id=song_id,
-                        title=details.get('title'),
-                        artist=details.get('artist'),
-                        album=details.get('album'),
-                        genre=details.get('genre'),
-                        duration_seconds=details.get('duration_seconds'),
-                        file_path=details.get('file_path'),
-                        image_path=details.get('image_path')
-                    )
-                    self.song_library[song_id] = song
-
-                playlists_data = data.get('playlists', {})
-                fav_ids = playlists_data.get("My Favourites", [])
-                for song_id in fav_ids:
-                    song = self.song_library.get(song_id)
-                    if song:
-                        self.favourite_playlist.add_song(song)
-
-                for name, song_ids in playlists_data.items():
-                    if name == "My Favourites":
-                        continue
-                    dll = DoublyLinkedList(name)
-                    self.user_playlists[name] = dll
-                    for song_id in song_ids:
-                        song = self.song_library.get(song_id)
-                        if song:
-                            dll.add_song(song)
-
-            print("Data berhasil dimuat.")
+            data = self.storage.load()
+            self._load_model(data)
+            if not data.get('songs') and not data.get('playlists'):
+                print("File data tidak ditemukan. Memulai dengan data kosong.")
+            else:
+                print("Data berhasil dimuat.")
         except Exception as e:
             print(f"Error memuat data: {e}. Memulai dengan data kosong.")
-            self.song_library = {}
-            self.user_playlists = {}
-            self.favourite_playlist = DoublyLinkedList("My Favourites")
-            self.username = "Mokhammad Bahauddin"
+            self._reset_model()
 
-    def save_data(self):
+    def _reset_model(self):
+        self._library_generation += 1
+        self.song_library = {}
+        # Array padat lagu library (+ posisi per ID) untuk pilih acak O(1) tanpa membangun list baru
+        self._library_order = []
+        self._library_pos = {}
+        self.genre_index = FieldIndex('genre')
+        self.artist_index = FieldIndex('artist')
+        self.search_index = SearchIndex()
+        # Judul/artis/album dinormalisasi sekali oleh search index; autocomplete dan kunci sort memakainya
+        normalized = self.search_index.normalized
+        self.duration_index = RangeIndex('duration_seconds')
+        self.song_table = SongTable() if USE_SONG_TABLE and NUMPY_AVAILABLE else None
+        # Kunci sort (judul/artis/album ternormalisasi, durasi) dihitung saat view terurut pertama
+        # kali dibuka, lalu dijaga tetap terurut, jadi view hanya mengambil satu halaman
+        self.sort_indexes = {
+            'title': RangeIndex('title', key=lambda song: normalized(song.song_id, 'title')),
+            'artist': RangeIndex('artist', key=lambda song: normalized(song.song_id, 'artist')),
+            'album': RangeIndex('album', key=lambda song: normalized(song.song_id, 'album')),
+            'duration': self.duration_index,
+        }
+        self.autocomplete = AutocompleteIndex(normalized=normalized)
+        # Vektor fitur per lagu untuk next/prev "lagu mirip" (None jika NumPy tidak terpasang)
+        self.similarity = SimilarityEngine() if NUMPY_AVAILABLE else None
+        self.audio_vectors = {}  # song_id -> vektor fitur audio yang sudah dimasukkan ke similarity
+        if self.knn_graph is not None:
+            self.knn_graph.cancel()  # Build lama (jika masih jalan) menghitung library yang sudah diganti
+        self.knn_graph = None
+        if self.similarity is not None:
+            self.knn_graph = KnnGraph(self.similarity, SIMILAR_NEIGHBOURS, MIN_SIMILARITY, lock=self._state_lock)
+        self.play_counts = {}  # song_id -> berapa kali diputar (bobot autocomplete)
+        self.user_playlists = {}
+        self.favourite_playlist = DoublyLinkedList(FAVOURITES_NAME)
+        self.username = DEFAULT_USERNAME
+
+    def _load_model(self, data):
+        """Membangun model dari data, lalu memasang fitur audio dari cache, riwayat transisi dan graf lagu mirip."""
+        self._populate(data)
+        self._apply_audio_features(self._cached_audio_features())
+        if self.similarity is not None:
+            # Konteks co-occurrence diisi dari riwayat putar yang tersimpan, bukan hanya dari sesi
+            # ini, tetapi baru saat skor pertama dihitung: riwayat tidak dibaca saat startup
+            self.similarity.defer_transitions(self._stored_transitions)
+        self._load_knn_graph()
+
+    def _stored_transitions(self):
+        try:
+            return self.play_history.transitions()
+        except Exception as e:
+            print(f"Riwayat putar tidak bisa dipakai untuk lagu mirip: {e}")
+            return []
+
+    def _knn_fingerprint(self):
         try:
-            data_to_save = {
+            history_version = self.play_history.version()
+        except Exception:
+            history_version = None
+        return library_fingerprint(self._library_order, self.audio_vectors, history_version)
+
+    def _populate(self, data):
+        """Membangun ulang Song dan DoublyLinkedList dari dictionary data (format music_data.json)."""
+        self._reset_model()
+        self.username = data.get('username', DEFAULT_USERNAME)
+        songs_data = data.get('songs', {})
+        play_counts = data.get('play_counts', {})
+        for song_id, details in songs_data.items():
+            song = Song(
+                song_id=song_id,
+                title=details.get('title'),
+                artist=details.get('artist'),
+                album=details.get('album'),
+                genre=details.get('genre'),
+                duration_seconds=details.get('duration_seconds'),
+                file_path=details.get('file_path'),
+                image_path=details.get('image_path')
+            )
+            self.song_library[song_id] = song
+            if play_counts.get(song_id):
+                self.play_counts[song_id] = play_counts[song_id]
+            self._index_song(song, self.play_counts.get(song_id, 0))
+
+        playlists_data = data.get('playlists', {})
+        fav_ids = playlists_data.get(FAVOURITES_NAME, [])
+        for song_id in fav_ids:
+            song = self.song_library.get(song_id)
+            if song:
+                self.favourite_playlist.add_song(song)
+
+        for name, song_ids in playlists_data.items():
+            if name == FAVOURITES_NAME:
+                continue
+            dll = DoublyLinkedList(name)
+            self.user_playlists[name] = dll
+            for song_id in song_ids:
+                song = self.song_library.get(song_id)
+                if song:
+                    dll.add_song(song)
+
+    def _index_song(self, song, play_count=0, order=None, seqs=None):
+        """Memasukkan lagu ke indeks library (tanpa graf kNN dan shuffle); order/seqs memulihkan urutan lamanya."""
+        self._library_index_add(song)
+        self.search_index.add(song, order)
+        self.autocomplete.add(song, play_count)
+        self.genre_index.add(song)
+        self.artist_index.add(song)
+        for name, index in self.sort_indexes.items():
+            index.add(song, seqs.get(name) if seqs else None)
+        if self.song_table is not None:
+            self.song_table.add(song)
+        if self.similarity is not None:
+            self.similarity.add(song)
+
+    @staticmethod
+    def _song_details(song_obj):
+        return {
+            'title': song_obj.title,
+            'artist': song_obj.artist,
+            'album': song_obj.album,
+            'genre': song_obj.genre,
+            'duration_seconds': song_obj.duration_seconds,
+            'file_path': song_obj.file_path,
+            'image_path': song_obj.image_path
+        }
+
+    def _build_snapshot(self):
+        """Membangun dictionary data lengkap (format music_data.json) dari state di memori."""
+        with self._state_lock:
+            data = {
                 'username': self.username,
                 'songs': {},
-                'playlists': {}
+                'playlists': {},
+                'play_counts': dict(self.play_counts)
             }
             for song_id, song_obj in self.song_library.items():
-                data_to_save['songs'][song_id] = {
-                    'title': song_obj.title,
-                    'artist': song_obj.artist,
-                    'album': song_obj.album,
-                    'genre': song_obj.genre,
-                    'duration_seconds': song_obj.duration_seconds,
-                    'file_path': song_obj.file_path,
-                    'image_path': song_obj.image_path
-                }
-            data_to_save['playlists']["My Favourites"] = [song.song_id for song in self.favourite_playlist.view_songs()]
+                data['songs'][song_id] = self._song_details(song_obj)
+            data['playlists'][FAVOURITES_NAME] = [song.song_id for song in self.favourite_playlist.view_songs()]
             for name, dll_obj in self.user_playlists.items():
-                data_to_save['playlists'][name] = [song.song_id for song in dll_obj.view_songs()]
+                data['playlists'][name] = [song.song_id for song in dll_obj.view_songs()]
+            return data
 
-            with open(DATA_FILE, 'w') as f:
-                json.dump(data_to_save, f, indent=4)
+    def save_data(self):
+        """Menulis snapshot lengkap sekarang juga (journal yang tercakup dibuang)."""
+        try:
+            self.storage.save(self._build_snapshot())
             print("Data berhasil disimpan.")
         except Exception as e:
             print(f"Error menyimpan data: {e}")
 
+    def flush(self):
+        """Memastikan semua perubahan yang tertunda sudah tertulis ke disk (dipanggil saat aplikasi ditutup)."""
+        try:
+            self.storage.flush()
+        except Exception as e:
+            print(f"Error menyimpan data: {e}")
+        self.play_history.flush()
+        if self.knn_graph is not None and len(self.knn_graph):
+            with self._state_lock:
+                fingerprint = self._knn_fingerprint()
+            # Kompaksi riwayat putar mengubah versinya: graf disimpan ulang agar tetap cocok saat startup
+            if self.knn_graph.changed or fingerprint != self._knn_saved_fingerprint:
+                self._save_knn_graph()
+
+    def _load_knn_graph(self):
+        """Memuat graf lagu mirip dari disk; jika tidak ada/usang, dibangun di background."""
+        if self.knn_graph is None or not self._library_order:
+            return
+        graph = self.knn_graph
+        fingerprint = self._knn_fingerprint()
+        if graph.load(self.knn_path, fingerprint):
+            self._knn_saved_fingerprint = fingerprint
+        else:
+            graph.start_background_build(on_done=self._save_knn_graph)
+
+    def _save_knn_graph(self):
+        try:
+            with self._state_lock:
+                fingerprint = self._knn_fingerprint()
+            self.knn_graph.save(self.knn_path, fingerprint)
+            self._knn_saved_fingerprint = fingerprint
+        except Exception as e:
+            print(f"Error menyimpan graf lagu mirip: {e}")
+
+    # --- Fitur audio ---
+    def _cached_audio_features(self):
+        if self.similarity is None:
+            return {}
+        cache = audio_features.FeatureCache()
+        return audio_features.cached_features(self._library_order, cache)
+
+    def _apply_audio_features(self, features_by_song):
+        """Memasukkan fitur audio ke SimilarityEngine dan memperbarui graf kNN yang terdampak."""
+        if self.similarity is None or not features_by_song:
+            return
+        with self._state_lock:
+            changed = []
+            for song_id, features in features_by_song.items():
+                if song_id not in self.song_library:
+                    continue
+                vector = audio_features.feature_vector(features)
+                self.audio_vectors[song_id] = vector
+                self.similarity.set_audio_features(song_id, vector)
+                changed.append(song_id)
+            if not changed or not len(self.knn_graph):
+                return
+            if len(changed) > AUDIO_REBUILD_THRESHOLD:
+                self.knn_graph.rebuild(on_done=self._save_knn_graph)
+            else:
+                for song_id in changed:
+                    self.knn_graph.update(song_id)
+
+    def analyse_audio_features(self, workers=None, progress=None, on_done=None):
+        """
+        Menganalisis file audio yang baru/berubah di background (process pool), lalu
+        memakai hasilnya untuk lagu mirip. Mengembalikan thread-nya, atau None tanpa NumPy.
+        """
+        if self.similarity is None:
+            print("NumPy tidak tersedia: analisis audio dilewati.")
+            return None
+        with self._state_lock:
+            songs = list(self._library_order)
+
+        def run_analysis():
+            try:
+                cache = audio_features.FeatureCache()
+                results = audio_features.extract_features(songs, cache, workers=workers, progress=progress)
+                self._apply_audio_features(results)
+            except Exception as e:
+                print(f"Error analisis audio: {e}")
+            if on_done is not None:
+                on_done()
+
+        t = threading.Thread(target=run_analysis, daemon=True)
+        t.start()
+        return t
+
+    def _record(self, op, **payload):
+        """Mencatat satu mutasi kecil ke storage, bukan menulis ulang seluruh file."""
+        if self._batch_records is not None:
+            # Di dalam batch(): ditahan dan ditulis sekali saat batch selesai
+            self._batch_records.append(dict(payload, op=op))
+            return
+        try:
+            self.storage.record(op, **payload)
+        except Exception as e:
+            print(f"Error menyimpan data: {e}")
+
+    def _undo(self, step, *args):
+        """Di dalam batch(): mencatat cara membatalkan mutasi yang baru saja diterapkan."""
+        if self._batch_undo is not None:
+            self._batch_undo.append(functools.partial(step, *args))
+
+    def _after_commit(self, action):
+        """Menjalankan aksi di luar model sekarang, atau (di dalam batch) setelah batch selesai tanpa rollback."""
+        if self._batch_deferred is not None:
+            self._batch_deferred.append(action)
+        else:
+            action()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Mengelompokkan beberapa mutasi menjadi satu unit.
+        Semua perubahan diterapkan di memori dan ditulis sekali saat keluar dari blok;
+        jika ada exception, setiap mutasi dibatalkan (urutan mundur) sehingga state
+        di memori kembali seperti sebelum batch.
+        """
+        with self._state_lock:
+            if self._batch_records is not None:
+                # Batch bersarang ikut batch terluar
+                yield self
+                return
+
+            self._batch_records = []
+            self._batch_undo = []
+            self._batch_deferred = []
+            try:
+                yield self
+            except BaseException:
+                self._rollback()
+                print("Batch dibatalkan, perubahan dikembalikan.")
+                raise
+            records, self._batch_records = self._batch_records, None
+            self._batch_undo = None
+            deferred, self._batch_deferred = self._batch_deferred, None
+            try:
+                self.storage.record_many(records)
+            except Exception as e:
+                print(f"Error menyimpan data: {e}")
+            for action in deferred:
+                action()
+
+    def _rollback(self):
+        """Menjalankan langkah pembatalan batch dari yang terakhir; record yang dihasilkannya ikut dibuang."""
+        steps, self._batch_undo = self._batch_undo, None
+        self._batch_deferred = None
+        for step in reversed(steps):
+            try:
+                step()
+            except Exception as e:
+                print(f"Error membatalkan perubahan: {e}")
+        records, self._batch_records = self._batch_records, None
+        if any(record['op'] == 'delete_song' for record in records):
+            # Lagu yang dikembalikan masuk di akhir dict; urutan library sama dengan urutan search index
+            self.song_library = dict(sorted(self.song_library.items(),
+                                            key=lambda item: self.search_index.order_of(item[0])))
+        self._refresh_lookahead()
+
     # --- FUNGSI YANG DIPERBARUI ---
+    @_mutation
     def set_username(self, new_name):
         if new_name:
+            self._undo(self.set_username, self.username)
             self.username = new_name
-            self.save_data()
+            self._record('set_username', name=new_name)
             return True
         return False
 
+    @_library_mutation
     def admin_add_song(self, s_id, title, artist, album, genre, duration, file_path, image_path):
         # --- FITUR BARU: Auto-Generate ID jika kosong ---
         if not s_id:
@@ -265,38 +964,77 @@ class MusicPlayer:
 
         new_song = Song(s_id, title, artist, album, genre, duration, file_path, image_path)
         self.song_library[s_id] = new_song
-        self.save_data()
+        self._index_song(new_song)
+        if self.shuffle_engine.context == 'library':
+            self.shuffle_engine.add(new_song)
+        if self.similarity is not None:
+            self.knn_graph.add(s_id)
+        self._undo(self.admin_delete_song, s_id)
+        self._record('add_song', song_id=s_id, details=self._song_details(new_song))
         print(f"Sukses! Lagu '{title}' ditambahkan dengan ID: {s_id}")
         return True
     def get_song_by_id(self, song_id):
         return self.song_library.get(song_id)
 
+    def _library_index_add(self, song):
+        self._library_pos[song.song_id] = len(self._library_order)
+        self._library_order.append(song)
+
+    def _library_index_remove(self, song_id):
+        # Tukar dengan elemen terakhir lalu pop: O(1)
+        pos = self._library_pos.pop(song_id, None)
+        if pos is None:
+            return
+        last = self._library_order.pop()
+        if pos < len(self._library_order):
+            self._library_order[pos] = last
+            self._library_pos[last.song_id] = pos
+
+    @_library_mutation
     def admin_update_song(self, song_id, title, artist, album, genre, image_path):
         song_to_update = self.get_song_by_id(song_id)
         if song_to_update:
+            self._undo(self.admin_update_song, song_id, song_to_update.title, song_to_update.artist,
+                       song_to_update.album, song_to_update.genre, song_to_update.image_path)
             song_to_update.update_details(title, artist, album, genre, image_path)
-            self.save_data()
+            self.search_index.update(song_to_update)
+            self.autocomplete.update(song_to_update)
+            self.genre_index.update(song_to_update)
+            self.artist_index.update(song_to_update)
+            for index in self.sort_indexes.values():
+                index.update(song_to_update)
+            if self.song_table is not None:
+                self.song_table.update(song_to_update)
+            if self.similarity is not None:
+                self.similarity.update(song_to_update)
+                self.knn_graph.update(song_id)
+            self._record('update_song', song_id=song_id, details=self._song_details(song_to_update))
             print(f"Lagu '{song_id}' berhasil diupdate.")
             return True
         print(f"Error: Lagu '{song_id}' tidak ditemukan untuk diupdate.")
         return False
 
+    @_library_mutation
     def admin_delete_song(self, song_id):
         song_to_delete = self.get_song_by_id(song_id)
         if not song_to_delete:
             print(f"Error: Lagu '{song_id}' tidak ditemukan.")
             return False
-
-        nodes_to_remove = list(song_to_delete.playlist_nodes)
-
-        fav_nodes = [node for node in nodes_to_remove if node in self.favourite_playlist.view_songs()]
-        for node in fav_nodes:
-            self.favourite_playlist._remove_node(node)
-
-        for playlist in self.user_playlists.values():
-            pl_nodes = [node for node in nodes_to_remove if node in playlist.view_songs()]
-            for node in pl_nodes:
-                playlist._remove_node(node)
+        if self._batch_undo is not None:
+            # Posisi di setiap playlist dicatat sebelum cascade, agar rollback bisa menyisipkannya kembali
+            placements = [(node.playlist.name, node.playlist.index_of_node(node),
+                           node.playlist.current_song_node is node)
+                          for node in song_to_delete.playlist_nodes if node.playlist is not None]
+            self._undo(self._restore_deleted_song, song_to_delete, placements,
+                       self.play_counts.get(song_id, 0), self.audio_vectors.get(song_id),
+                       self.search_index.order_of(song_id),
+                       {name: index.seq_of(song_id) for name, index in self.sort_indexes.items()})
+
+        # Cascade O(k): setiap node tahu playlist pemiliknya, jadi cukup lepas node-node milik lagu ini
+        for node in song_to_delete.playlist_nodes:
+            if node.playlist is not None:
+                node.playlist._remove_node(node, detach_from_song=False)
+        song_to_delete.playlist_nodes = ()
 
         if self.current_song == song_to_delete:
             self.stop_song()
@@ -304,10 +1042,57 @@ class MusicPlayer:
             self.current_context = None
 
         self.song_library.pop(song_id, None)
-        self.save_data()
+        self._library_index_remove(song_id)
+        self.search_index.remove(song_id)
+        self.autocomplete.remove(song_id)
+        self.play_counts.pop(song_id, None)
+        self.shuffle_engine.remove(song_to_delete)
+        self.genre_index.remove(song_id)
+        self.artist_index.remove(song_id)
+        for index in self.sort_indexes.values():
+            index.remove(song_id)
+        if self.song_table is not None:
+            self.song_table.remove(song_id)
+        if self.similarity is not None:
+            self.similarity.remove(song_id)
+            self.knn_graph.remove(song_id)
+            self.audio_vectors.pop(song_id, None)
+        if self._lookahead is not None and self._lookahead[0] is song_to_delete:
+            # Baru sesudah semua indeks bersih, agar lagu ini tidak terpilih lagi
+            self._refresh_lookahead()
+        self._after_commit(functools.partial(self.play_history.forget_song, song_id))
+        self._record('delete_song', song_id=song_id)
         print(f"Sukses! Lagu '{song_to_delete.title}' telah dihapus sepenuhnya.")
         return True
 
+    @_library_mutation
+    def _restore_deleted_song(self, song, placements, play_count, audio_vector, order, seqs):
+        """Pembatalan admin_delete_song: objek Song yang sama kembali ke library, indeks, graf dan playlist."""
+        song_id = song.song_id
+        self.song_library[song_id] = song
+        if play_count:
+            self.play_counts[song_id] = play_count
+        self._index_song(song, play_count, order, seqs)
+        if self.similarity is not None:
+            if audio_vector is not None:
+                self.audio_vectors[song_id] = audio_vector
+                self.similarity.set_audio_features(song_id, audio_vector)
+            self.knn_graph.add(song_id)
+        if self.shuffle_engine.context == 'library':
+            self.shuffle_engine.add(song)
+        for playlist_name, index, was_current in sorted(placements, key=lambda placement: placement[1]):
+            self._insert_into_playlist(playlist_name, song, index, was_current)
+
+    def admin_delete_songs(self, song_ids):
+        """Menghapus banyak lagu sekaligus dengan satu kali simpan. Mengembalikan jumlah lagu yang terhapus."""
+        deleted = 0
+        with self.batch():
+            for song_id in song_ids:
+                if self.admin_delete_song(song_id):
+                    deleted += 1
+        return deleted
+
+    @_mutation
     def user_create_playlist(self, playlist_name):
         if not playlist_name:
             return False, "Nama playlist tidak boleh kosong."
@@ -315,48 +1100,238 @@ class MusicPlayer:
             return False, f"Playlist '{playlist_name}' sudah ada."
         else:
             self.user_playlists[playlist_name] = DoublyLinkedList(playlist_name)
-            self.save_data()
+            self._undo(self.user_delete_playlist, playlist_name)
+            self._record('create_playlist', name=playlist_name)
             return True, f"Playlist '{playlist_name}' dibuat."
 
+    @_mutation
     def add_song_to_playlist(self, song, playlist_name):
         playlist = self.user_playlists.get(playlist_name)
         if playlist:
             playlist.add_song(song)
-            self.save_data()
+            self._shuffle_context_changed(playlist, song, added=True)
+            self._undo(self._remove_last_from_playlist, playlist_name)
+            self._record('playlist_add', name=playlist_name, song_id=song.song_id)
             return True
         return False
 
+    def add_songs_to_playlist(self, songs, playlist_name):
+        """Menambahkan banyak lagu sekaligus ke playlist dengan satu kali simpan."""
+        if playlist_name not in self.user_playlists:
+            return False
+        with self.batch():
+            for song in songs:
+                self.add_song_to_playlist(song, playlist_name)
+        return True
+
+    @_mutation
     def remove_song_from_playlist(self, song, playlist_name):
         playlist = self.user_playlists.get(playlist_name)
         if playlist:
+            self._undo_removal(playlist, song)
             playlist.remove_song_by_user(song)
-            self.save_data()
+            self._shuffle_context_changed(playlist, song, added=False)
+            self._record('playlist_remove', name=playlist_name, song_id=song.song_id)
             return True
         return False
 
+    @_mutation
+    def move_song_in_playlist(self, playlist_name, from_index, to_index):
+        """Memindahkan lagu di posisi from_index ke to_index dalam playlist (termasuk My Favourites)."""
+        playlist = self._get_playlist(playlist_name)
+        if playlist is None or not (0 <= from_index < playlist.length() and 0 <= to_index < playlist.length()):
+            return False
+        if from_index == to_index:
+            return True
+        playlist.move(from_index, to_index)
+        self._undo(self.move_song_in_playlist, playlist_name, to_index, from_index)
+        if self.current_context is playlist:
+            self._refresh_lookahead()  # Lagu sesudah node aktif bisa berubah
+        self._record('playlist_move', name=playlist_name, from_index=from_index, to_index=to_index)
+        return True
+
+    def _shuffle_context_changed(self, playlist, song, added):
+        """
+        Melipat perubahan isi playlist ke permutasi shuffle yang sedang berjalan (tanpa acak
+        ulang), dan menentukan ulang lagu berikutnya jika playlist ini sedang diputar.
+        """
+        if self.shuffle_engine.context is playlist:
+            if added:
+                self.shuffle_engine.add(song)
+            elif not playlist.contains(song):
+                self.shuffle_engine.remove(song)
+        if self.current_context is playlist:
+            self._refresh_lookahead()
+
+    # --- Pembatalan mutasi playlist (rollback batch) ---
+    def _undo_removal(self, playlist, song):
+        """Mencatat posisi kemunculan pertama lagu sebelum dihapus dari playlist."""
+        if self._batch_undo is None:
+            return
+        node = playlist.find_node_by_song(song)
+        if node is not None:
+            self._undo(self._insert_into_playlist, playlist.name, song, playlist.index_of_node(node),
+                       playlist.current_song_node is node)
+
+    def _insert_into_playlist(self, playlist_name, song, index, make_current=False):
+        playlist = self._get_playlist(playlist_name)
+        if playlist is None:
+            return
+        playlist.add_song(song)
+        playlist.move(playlist.length() - 1, index)
+        if make_current:
+            playlist.current_song_node = playlist.node_at(index)
+        self._shuffle_context_changed(playlist, song, added=True)
+
+    def _remove_last_from_playlist(self, playlist_name):
+        playlist = self._get_playlist(playlist_name)
+        if playlist is None or playlist.tail is None:
+            return
+        song = playlist.tail.song
+        playlist._remove_node(playlist.tail)
+        self._shuffle_context_changed(playlist, song, added=False)
+
+    def _restore_playlist(self, playlist_name, songs, position, was_context, current_index):
+        """Pembatalan user_delete_playlist: isi dan posisi playlist di daftar dibuat ulang."""
+        playlist = DoublyLinkedList(playlist_name)
+        for song in songs:
+            playlist.add_song(song)
+        entries = list(self.user_playlists.items())
+        entries.insert(position, (playlist_name, playlist))
+        self.user_playlists.clear()
+        self.user_playlists.update(entries)
+        if current_index is not None:
+            playlist.current_song_node = playlist.node_at(current_index)
+        if was_context:
+            self.current_context = playlist
+
+    def _get_playlist(self, playlist_name):
+        if playlist_name == FAVOURITES_NAME:
+            return self.favourite_playlist
+        return self.user_playlists.get(playlist_name)
+
+    def is_favourite(self, song):
+        """Cek O(1) apakah lagu ada di My Favourites."""
+        return self.favourite_playlist.contains(song)
+
+    def playlist_contains(self, playlist_name, song):
+        """Cek O(1) apakah lagu ada di playlist (termasuk My Favourites)."""
+        playlist = self._get_playlist(playlist_name)
+        return playlist is not None and playlist.contains(song)
+
+    @_mutation
     def toggle_favourite(self, song):
-        is_favourite = False
-        current = self.favourite_playlist.head
-        while current:
-            if current.song == song:
-                is_favourite = True
-                break
-            current = current.next
-        if is_favourite:
+        if self.is_favourite(song):
+            self._undo_removal(self.favourite_playlist, song)
             self.favourite_playlist.remove_song_by_user(song)
+            self._shuffle_context_changed(self.favourite_playlist, song, added=False)
+            self._record('playlist_remove', name=FAVOURITES_NAME, song_id=song.song_id)
         else:
             self.favourite_playlist.add_song(song)
-        self.save_data()
+            self._shuffle_context_changed(self.favourite_playlist, song, added=True)
+            self._undo(self._remove_last_from_playlist, FAVOURITES_NAME)
+            self._record('playlist_add', name=FAVOURITES_NAME, song_id=song.song_id)
 
         # --- DIPERBARUI: Fungsi Pencarian ---
 
-    def user_search_song(self, query):
-        results = []
-        query_lower = query.lower()  # Untuk pencarian case-insensitive
-        query_original = query  # Untuk pencocokan ID case-sensitive
+    def _cached_query(self, kind, query, compute):
+        """Hasil query dari cache LRU; dihitung ulang hanya jika belum ada untuk generasi library ini."""
+        with self._state_lock:
+            key = (kind, query, self._library_generation)
+            result = self.query_cache.get(key)
+            if result is None:
+                result = tuple(compute())
+                self.query_cache.put(key, result)
+            return list(result)
+
+    def query_cache_stats(self):
+        """Statistik cache query: hits, misses, size, capacity, hit_rate."""
+        return self.query_cache.stats()
 
+    def user_search_song(self, query):
         if not query:
             return []
+        # Query terstruktur (artist:, genre:, duration:, ...) dijawab oleh planner
+        if query_parser.is_structured(query):
+            try:
+                return self.query_songs(query, limit=None)['songs']
+            except query_parser.QuerySyntaxError as e:
+                print(f"Error query: {e}")
+                return []
+        return self._cached_query('search', query, lambda: self._search_songs(query))
+
+    def query_songs(self, query, sort=None, descending=False, offset=0, limit=50):
+        """
+        Query terstruktur, mis. `artist:adele genre:pop duration:<240` (lihat query_parser).
+        sort: None (urutan library), 'title', 'artist', 'album' atau 'duration'.
+        Mengembalikan {'total', 'offset', 'limit', 'songs'} dengan hanya satu halaman lagu.
+        Melempar query_parser.QuerySyntaxError jika nilai field tidak valid.
+        """
+        self._sort_index(sort)
+        predicates = query_parser.parse_query(query)
+
+        def run():
+            return self._sorted_songs(query_parser.execute(predicates, self), sort, descending)
+
+        songs = self._cached_query('query', (query, sort, descending), run)
+        return self._page(songs, offset, limit)
+
+    # --- Halaman & urutan untuk view ---
+    def get_library_page(self, sort=None, descending=False, offset=0, limit=50):
+        """Satu halaman library. sort: None (urutan ditambahkan), 'title', 'artist', 'album', 'duration'."""
+        with self._state_lock:
+            index = self._sort_index(sort)
+            total = len(self.song_library)
+            if index is not None:
+                songs = [self.song_library[song_id] for song_id in index.page(offset, limit, descending)]
+            else:
+                values = reversed(self.song_library.values()) if descending else iter(self.song_library.values())
+                end = None if limit is None else offset + limit
+                songs = list(itertools.islice(values, offset, end))
+            return {'total': total, 'offset': offset, 'limit': limit, 'songs': songs}
+
+    def get_playlist_page(self, playlist_name, sort=None, descending=False, offset=0, limit=50):
+        """Satu halaman playlist (atau My Favourites). Tanpa sort: urutan playlist, O(log n + limit)."""
+        with self._state_lock:
+            self._sort_index(sort)
+            playlist = self._get_playlist(playlist_name)
+            if playlist is None:
+                return {'total': 0, 'offset': offset, 'limit': limit, 'songs': []}
+            if sort is None:
+                return {'total': playlist.length(), 'offset': offset, 'limit': limit,
+                        'songs': playlist.songs_slice(offset, limit, descending)}
+            return self._page(self._sorted_songs(playlist.view_songs(), sort, descending), offset, limit)
+
+    def search_page(self, query, sort=None, descending=False, offset=0, limit=50):
+        """Satu halaman hasil user_search_song. Tanpa sort: urutan relevansi."""
+        self._sort_index(sort)
+        return self._page(self._sorted_songs(self.user_search_song(query), sort, descending), offset, limit)
+
+    def _sort_index(self, sort):
+        """RangeIndex untuk kolom sort (None jika tanpa sort). ValueError jika kolom tidak dikenal."""
+        if sort is None:
+            return None
+        index = self.sort_indexes.get(sort)
+        if index is None:
+            raise ValueError(f"Kolom sort tidak dikenal: {sort}")
+        return index
+
+    def _sorted_songs(self, songs, sort, descending):
+        index = self._sort_index(sort)
+        if index is not None:
+            songs.sort(key=lambda song: index.sort_key(song.song_id), reverse=descending)
+        elif descending:
+            songs.reverse()
+        return songs
+
+    @staticmethod
+    def _page(songs, offset, limit):
+        end = None if limit is None else offset + limit
+        return {'total': len(songs), 'offset': offset, 'limit': limit, 'songs': songs[offset:end]}
+
+    def _search_songs(self, query):
+        results = []
+        query_original = query  # Untuk pencocokan ID case-sensitive
 
         # 1. Prioritas Utama: Pencocokan ID Lagu (case-sensitive)
         song_by_id = self.get_song_by_id(query_original)
@@ -364,23 +1339,26 @@ class MusicPlayer:
             results.append(song_by_id)
             return results  # Jika ID cocok, kembalikan HANYA lagu itu
 
-        # 2. Pencarian Luas (case-insensitive)
-        for song in self.song_library.values():
-            if (query_lower in song.title.lower() or
-                    query_lower in song.artist.lower() or
-                    query_lower in song.album.lower() or
-                    query_lower in song.genre.lower()):  # <-- BARU: Ditambahkan pencarian genre
-                results.append(song)
+        # 2. Pencarian Luas (tanpa beda huruf besar/kecil & diakritik): semua kata harus cocok
+        #    persis, sebagai awalan, atau mirip (salah ketik) dengan kata di ID, judul, artis,
+        #    album atau genre. Hasil diurutkan dari yang paling cocok.
+        for song_id in self.search_index.search(query):
+            results.append(self.song_library[song_id])
         return results
 
+    def get_search_suggestions(self, prefix, limit=None):
+        """Saran pelengkapan (judul/artis/album) untuk teks yang sedang diketik, paling sering diputar dulu."""
+        with self._state_lock:
+            return self.autocomplete.suggest(prefix, limit)
+
     def get_songs_by_genre(self, genre):
         if genre.lower() == "all":
-            return list(self.song_library.values())
-        results = []
-        for song in self.song_library.values():
-            if song.genre.lower() == genre.lower():
-                results.append(song)
-        return results
+            return self._cached_query('genre', None, self.song_library.values)
+        return self._cached_query('genre', field_key(genre), lambda: self.genre_index.songs(genre))
+
+    def get_genres(self):
+        """Daftar (genre, jumlah lagu) dari index genre, genre terbanyak dulu."""
+        return self._cached_query('genres', None, self.genre_index.values)
 
     def get_recently_played(self):
         unique_songs = []
@@ -391,6 +1369,7 @@ class MusicPlayer:
 
     def toggle_shuffle(self):
         self.is_shuffle = not self.is_shuffle
+        self._refresh_lookahead()
         return self.is_shuffle
 
     def cycle_repeat_mode(self):
@@ -400,6 +1379,7 @@ class MusicPlayer:
             self.repeat_mode = "one"
         elif self.repeat_mode == "one":
             self.repeat_mode = "none"
+        self._refresh_lookahead()
         return self.repeat_mode
 
     def play_song(self, song, context_playlist=None):
@@ -407,16 +1387,22 @@ class MusicPlayer:
             print(f"Error: Tidak ada file audio valid untuk {song.title}")
             return
 
-        self.current_seek_time = 0.0
+        previous_song = self.current_song
+        self._cancel_queue()  # Prefetch yang masih berjalan tidak boleh mengantre ke lagu baru
         self.current_song = song
         self.is_playing = True
+        with self._state_lock:
+            prefetched, self._prefetched = self._prefetched, None
         try:
-            pygame.mixer.music.load(song.file_path)
+            if prefetched is not None and prefetched[0] is song:
+                # Next manual / akhir lagu tanpa antrean sah: file sudah dibaca oleh prefetch
+                pygame.mixer.music.load(io.BytesIO(prefetched[1]),
+                                        namehint=os.path.splitext(song.file_path)[1].lstrip('.'))
+            else:
+                pygame.mixer.music.load(song.file_path)
             pygame.mixer.music.play()
 
-            # --- UPDATE INI ---
-            self.current_seek_time = 0.0
-            self.start_time = time.time()  # Catat waktu mulai
+            self.clock.start()
             self.is_playing = True
             print(f"▶️ Memutar: {song.title}")
         except Exception as e:
@@ -424,143 +1410,364 @@ class MusicPlayer:
             self.is_playing = False
             return
 
+        # load() + play() membuang antrean mixer
+        self._mixer_has_queue = False
+        self._last_mixer_pos = 0
+        self._song_started(song, context_playlist, previous_song)
+
+    def _song_started(self, song, context_playlist, previous_song):
+        """Pembukuan setelah sebuah lagu mulai berbunyi (lewat play_song atau antrean gapless)."""
         self.recently_played_history.append(song)
+        self._count_play(song)
+        try:
+            self.play_history.record_play(song.song_id)
+        except Exception as e:
+            print(f"Error menyimpan riwayat putar: {e}")
+        if previous_song is not None and previous_song is not song and self.similarity is not None:
+            if not self.similarity.transitions_pending:
+                # Selama riwayat belum dimasukkan, transisi ini ikut terbaca bersamanya
+                self.similarity.record_transition(previous_song.song_id, song.song_id)
+            # Perubahan kecil: graf diperbarui oleh worker background, bukan di thread pemutaran
+            self.knn_graph.update_async((previous_song.song_id, song.song_id))
         if context_playlist:
             self.current_context = context_playlist
-            node = context_playlist.find_node_by_song(song)
-            if node:
-                context_playlist.current_song_node = node
+            # Lagu duplikat: pertahankan node yang sedang aktif jika isinya lagu ini,
+            # selain itu lompat ke kemunculan pertama
+            current_node = context_playlist.current_song_node
+            if current_node is None or current_node.song is not song:
+                node = context_playlist.find_node_by_song(song)
+                if node:
+                    context_playlist.current_song_node = node
         else:
             self.current_context = 'library'
+        self._refresh_lookahead()
+
+    @_mutation
+    def _count_play(self, song):
+        if song.song_id not in self.song_library:
+            return
+        self.play_counts[song.song_id] = self.play_counts.get(song.song_id, 0) + 1
+        self.autocomplete.record_play(song.song_id)
+        self._undo(self._uncount_play, song.song_id)
+        self._record('play', song_id=song.song_id)
+
+    def _uncount_play(self, song_id):
+        count = self.play_counts.get(song_id, 0) - 1
+        if count > 0:
+            self.play_counts[song_id] = count
+        else:
+            self.play_counts.pop(song_id, None)
+        self.autocomplete.record_play(song_id, -1)
 
     def stop_song(self):
         if self.is_playing:
             # PAUSE
             pygame.mixer.music.pause()
             self.is_playing = False
-            # Hitung sudah berapa lama lagu berjalan sebelum dipause
-            # dan tambahkan ke seek_time
-            self.current_seek_time += time.time() - self.start_time
+            self.clock.pause()
             print(f"⏹️ Jeda: {self.current_song.title}")
         else:
             if self.current_song:
                 # UNPAUSE
                 pygame.mixer.music.unpause()
                 self.is_playing = True
-                # Reset start_time ke "sekarang"
-                self.start_time = time.time()
+                self.clock.resume()
                 print(f"▶️ Melanjutkan: {self.current_song.title}")
 
     def seek_song(self, time_seconds):
         if not self.current_song: return
         try:
             pygame.mixer.music.play(start=time_seconds)
-            # --- UPDATE INI ---
-            self.current_seek_time = time_seconds  # Set posisi baru
-            self.start_time = time.time()  # Reset waktu mulai
+            self._last_mixer_pos = 0  # play() memulai get_pos dari nol lagi
+            self.clock.start(time_seconds)  # get_pos tidak tahu offset seek, clock yang menyimpannya
 
             if not self.is_playing:
                 pygame.mixer.music.pause()
+                self.clock.pause()
         except Exception as e:
             print(f"Error seeking MP3: {e}")
 
     def get_current_playback_time(self):
+        """Posisi lagu (detik) menurut PlaybackClock; dipakai bersama oleh slider, lirik dan visualizer."""
         if not self.current_song:
             return 0.0
-
-        if self.is_playing:
-            # Waktu total = (Waktu yang sudah tersimpan/seek) + (Waktu sejak tombol play ditekan)
-            return self.current_seek_time + (time.time() - self.start_time)
-        else:
-            # Jika pause, cukup kembalikan waktu terakhir yang disimpan
-            return self.current_seek_time
+        return self.clock.position()
 
     # --- DIPERBARUI: Implementasi Lagu Mirip ---
     def _find_similar_song(self):
-        """Mencari lagu yang mirip berdasarkan Artis, lalu Genre."""
+        """Undian berbobot dari tetangga kNN dan penerus di riwayat putar; tanpa keduanya: artis lalu genre sama."""
         if not self.current_song:
             return None
 
-        current_artist = self.current_song.artist
-        current_genre = self.current_song.genre
-
-        artist_matches = []
-        genre_matches = []
-
-        for song in self.song_library.values():
-            if song == self.current_song:
-                continue  # Jangan pilih lagu yang sama
-
-            # Prioritas 1: Artis yang sama
-            if song.artist == current_artist:
-                artist_matches.append(song)
-            # Prioritas 2: Genre yang sama
-            elif song.genre == current_genre:
-                genre_matches.append(song)
+        current = self.current_song
+
+        scores = {}
+        if self.knn_graph is not None:
+            # Daftar tetangga bisa masih memuat lagu yang baru dihapus sampai dihitung ulang
+            scores.update(pair for pair in self.knn_graph.neighbours(current.song_id)
+                          if pair[0] in self.song_library)
+        for song_id, weight in self.play_history.successors(current.song_id, SIMILAR_NEIGHBOURS):
+            if song_id in self.song_library and song_id != current.song_id:
+                scores[song_id] = scores.get(song_id, 0.0) + HISTORY_WEIGHT * weight
+        if scores:
+            # Lagu yang baru saja diputar dilewati agar next tidak bolak-balik di antara dua lagu
+            recent_ids = {song.song_id for song in self.recently_played_history}
+            candidates = [pair for pair in scores.items() if pair[0] not in recent_ids] or list(scores.items())
+            song_ids, weights = zip(*candidates)
+            print(f"Menemukan lagu mirip: {len(candidates)} kandidat (skor teratas {max(weights):.2f})")
+            return self.song_library[random.choices(song_ids, weights=weights)[0]]
+        if self.knn_graph is not None:
+            print("Tidak ada lagu mirip ditemukan.")
+            return None
 
-        if artist_matches:
-            print(f"Menemukan lagu mirip (artis sama): {len(artist_matches)} lagu")
-            return random.choice(artist_matches)
-        elif genre_matches:
-            print(f"Menemukan lagu mirip (genre sama): {len(genre_matches)} lagu")
-            return random.choice(genre_matches)
+        # Prioritas 1: Artis yang sama (lagu yang sedang diputar tidak ikut dipilih)
+        artist_song = self.artist_index.random_song(current.artist, exclude=current)
+        if artist_song:
+            print(f"Menemukan lagu mirip (artis sama): {self.artist_index.count(current.artist) - 1} lagu")
+            return artist_song
+        # Prioritas 2: Genre yang sama. Sampai di sini tidak ada lagu lain dari artis ini,
+        # jadi semua lagu lain di genre ini pasti artisnya berbeda.
+        genre_song = self.genre_index.random_song(current.genre, exclude=current)
+        if genre_song:
+            print(f"Menemukan lagu mirip (genre sama): {self.genre_index.count(current.genre) - 1} lagu")
+            return genre_song
 
         # Fallback jika tidak ada yang cocok
         print("Tidak ada lagu mirip ditemukan.")
         return None
 
+    def _shuffle_for(self, context):
+        """ShuffleEngine yang terikat ke konteks ini (permutasi dibuat ulang hanya jika konteks berganti)."""
+        engine = self.shuffle_engine
+        if engine.context is not context:
+            if context == 'library':
+                engine.reset(context, lambda: self._library_order, self.current_song)
+            else:
+                engine.reset(context, context.view_songs, self.current_song)
+        return engine
+
     def play_next_song(self):
         if not self.current_song: return
 
+        upcoming = self._take_lookahead()
+        if upcoming is None:
+            # Akhir playlist tanpa repeat, atau tidak ada lagu mirip: berhenti. Mixer ikut
+            # dihentikan, karena antrean usang bisa masih berbunyi ('ended' dari _track_ended).
+            # Event akhir dari stop() diabaikan _track_ended karena is_playing sudah False.
+            self.is_playing = False
+            self._mixer_has_queue = False
+            pygame.mixer.music.stop()
+            self.clock.pause()
+            return
+        song, context = upcoming
+        if self.repeat_mode == "one":
+            print(f"Mengulang lagu: {song.title}")
+        self.play_song(song, context_playlist=context)
+
+    # --- Lagu berikutnya (lookahead) & pemutaran gapless ---
+    def _resolve_next(self):
+        """
+        Menentukan lagu berikutnya tanpa mengubah state: (song, context, commit) atau None
+        jika pemutaran harus berhenti. commit() menjalankan langkahnya (node playlist /
+        permutasi shuffle) saat lagu itu benar-benar diputar.
+        """
+        current = self.current_song
+        if not current:
+            return None
+        playlist = self.current_context if isinstance(self.current_context, DoublyLinkedList) else None
+
         # 1. Mode Repeat One
         if self.repeat_mode == "one":
-            print(f"Mengulang lagu: {self.current_song.title}")
-            self.play_song(self.current_song, self.current_context)
-            return
+            return current, playlist, None
 
         # 2. Jika di dalam Playlist (Doubly Linked List)
-        if isinstance(self.current_context, DoublyLinkedList):
-            playlist = self.current_context
-            next_node = None
-
+        if playlist is not None:
             # 2a. Jika Shuffle aktif
             if self.is_shuffle:
-                all_songs = playlist.view_songs()
-                if not all_songs: self.is_playing = False; return
-                random_song = random.choice(all_songs)
-                self.play_song(random_song, context_playlist=playlist)
-                return
-
-            # 2b. Jika Shuffle non-aktif (mengikuti urutan DLL)
-            next_node = playlist.play_next()
-            if next_node:
-                self.play_song(next_node.song, context_playlist=playlist)
+                engine = self._shuffle_for(playlist)
+                next_song = engine.peek_next(current)
+                return (next_song, playlist, lambda: engine.advance_to(next_song, current)) if next_song else None
+
+            # 2b. Mengikuti urutan DLL; dari ekor kembali ke kepala (sama seperti play_next)
+            node = playlist.current_song_node
+            if node is not None:
+                next_node = node.next or playlist.head
+            elif self.repeat_mode == "all":
+                next_node = playlist.head
             else:
-                # Sampai di akhir playlist
-                if self.repeat_mode == "all":
-                    first_song_node = playlist.play_from_playlist()
-                    if first_song_node:
-                        self.play_song(first_song_node.song, context_playlist=playlist)
-                else:
-                    self.is_playing = False  # Berhenti di akhir playlist
+                next_node = None
+            if next_node is None:
+                return None
+
+            def commit():
+                playlist.current_song_node = next_node
+            return next_node.song, playlist, commit
+
+        # 3. Jika di Library: shuffle, atau lagu mirip
+        if self.is_shuffle:
+            engine = self._shuffle_for('library')
+            next_song = engine.peek_next(current)
+            return (next_song, None, lambda: engine.advance_to(next_song, current)) if next_song else None
+        similar_song = self._find_similar_song()
+        return (similar_song, None, None) if similar_song else None
+
+    def _prepare_similar(self):
+        """Menghitung daftar tetangga lagu ini (jika belum ada) sebelum _state_lock diambil, agar
+        _find_similar_song di bawah lock cukup membacanya."""
+        current = self.current_song
+        if (self.knn_graph is not None and current is not None and not self.is_shuffle
+                and not isinstance(self.current_context, DoublyLinkedList)):
+            self.knn_graph.neighbours(current.song_id)
+
+    def _take_lookahead(self):
+        """Lagu berikutnya yang sudah ditentukan (atau ditentukan sekarang), setelah langkahnya dijalankan."""
+        if self._lookahead is None:
+            self._prepare_similar()
+        with self._state_lock:
+            upcoming = self._lookahead or self._resolve_next()
+            self._cancel_queue()
+        if upcoming is None:
+            return None
+        song, context, commit = upcoming
+        if commit is not None:
+            commit()
+        return song, context
+
+    def peek_next_song(self):
+        """Lagu yang akan diputar setelah lagu ini (None jika pemutaran akan berhenti)."""
+        return self._lookahead[0] if self._lookahead else None
+
+    def _cancel_queue(self):
+        """Membatalkan lookahead; prefetch yang masih berjalan tidak akan menyentuh mixer."""
+        with self._state_lock:
+            self._queue_token += 1
+            self._lookahead = None
+            self._queued = None
+
+    def _refresh_lookahead(self):
+        """
+        Menentukan ulang lagu berikutnya lalu, di thread terpisah, membaca filenya ke memori
+        dan menyerahkannya ke pygame.mixer.music.queue agar mixer langsung menyambung
+        tanpa jeda. Isi file juga disimpan untuk play_song, jadi Next manual tidak membaca
+        disk lagi jika prefetch sudah selesai. Jika lagu berikutnya tidak berubah, prefetch
+        yang sedang berjalan atau antrean mixer yang ada tetap dipakai.
+        """
+        self._prepare_similar()
+        with self._state_lock:
+            if not self.current_song:
+                self._cancel_queue()
+                return
+            lookahead = self._resolve_next()
+            previous = self._lookahead
+            if (previous is not None and lookahead is not None and lookahead[0] is previous[0]
+                    and (self._queued is None or self._mixer_has_queue)):
+                # Lagu sama: cukup ganti konteks/commit-nya (prefetch mengambilnya dari _lookahead)
+                self._lookahead = lookahead
+                if self._queued is not None:
+                    self._queued = lookahead
+                return
+            self._cancel_queue()
+            self._lookahead = lookahead
+            token = self._queue_token
+        if lookahead is None:
+            return
+        song = lookahead[0]
+        if not song.file_path or song.file_path == "dummy/path.mp3":
+            return
 
-        # 3. Jika di Library (bukan playlist)
-        else:
-            # 3a. Jika Shuffle aktif (prioritas)
-            if self.is_shuffle:
-                all_songs_list = list(self.song_library.values())
-                if not all_songs_list: self.is_playing = False; return
-                random_song = random.choice(all_songs_list)
-                self.play_song(random_song, context_playlist=None)
+        def prefetch():
+            try:
+                with open(song.file_path, 'rb') as f:
+                    data = f.read()
+            except OSError as e:
+                print(f"Gagal menyiapkan lagu berikutnya {song.file_path}: {e}")
                 return
+            with self._state_lock:
+                if token != self._queue_token:
+                    return  # Lookahead sudah berganti selama file dibaca
+                self._prefetched = (song, data)
+                try:
+                    pygame.mixer.music.queue(io.BytesIO(data), namehint=os.path.splitext(song.file_path)[1].lstrip('.'))
+                except Exception as e:
+                    print(f"Gagal mengantrekan {song.file_path}: {e}")
+                    return
+                self._queued = self._lookahead
+                self._mixer_has_queue = True
+
+        t = threading.Thread(target=prefetch, daemon=True)
+        t.start()
 
-            # 3b. Jika Shuffle non-aktif (cari lagu mirip)
-            similar_song = self._find_similar_song()  # <-- PANGGIL FUNGSI YANG DIPERBARUI
-            if similar_song:
-                self.play_song(similar_song, context_playlist=None)
-            else:
-                # Sesuai PDF[cite: 39], berhenti jika tidak ada yang mirip
-                self.is_playing = False
+    # --- Notifikasi akhir lagu ---
+    def _init_end_event(self):
+        """Meminta mixer mengirim TRACK_END_EVENT; event SDL butuh subsistem display (tanpa jendela)."""
+        try:
+            if not pygame.display.get_init():
+                pygame.display.init()
+            # Antrean event hanya dipakai untuk notifikasi mixer
+            pygame.event.set_blocked(None)
+            pygame.event.set_allowed(TRACK_END_EVENT)
+            pygame.mixer.music.set_endevent(TRACK_END_EVENT)
+            return True
+        except pygame.error as e:
+            print(f"Event akhir lagu tidak tersedia ({e}); memakai posisi mixer.")
+            return False
+
+    def pump_events(self):
+        """
+        Memproses notifikasi akhir lagu dari mixer (dipanggil GUI selama ada lagu berbunyi).
+        Mengembalikan 'advanced' (mixer sudah menyambung ke lagu di antrean dan state ikut
+        pindah), 'ended' (lagu habis tanpa lanjutan yang sah; pemanggil memutar lagu
+        berikutnya) atau None.
+        """
+        if not self._end_events:
+            return self._poll_mixer_position()
+        result = None
+        for _ in pygame.event.get(TRACK_END_EVENT):
+            outcome = self._track_ended()
+            if outcome is not None and result != 'ended':
+                result = outcome
+        return result
+
+    def _track_ended(self):
+        if not self.is_playing:
+            return None
+        if not pygame.mixer.music.get_busy():
+            return 'ended'
+        # Mixer masih berbunyi: lagu di antrean sudah mulai
+        with self._state_lock:
+            queued = self._queued if self._mixer_has_queue else None
+            self._mixer_has_queue = False
+            if queued is None:
+                # Antrean usang (lookahead berganti sebelum penggantinya siap): pemanggil
+                # memutar lagu yang benar, yang sekaligus menggantikan bunyi ini
+                return 'ended'
+            self._advance_to_queued(queued)
+        return 'advanced'
+
+    def _poll_mixer_position(self):
+        """Cadangan tanpa event: get_pos() kembali ke nol saat antrean mulai, -1 saat mixer berhenti."""
+        if not self.is_playing:
+            return None
+        pos = pygame.mixer.music.get_pos()
+        last, self._last_mixer_pos = self._last_mixer_pos, pos
+        if pos < 0:
+            return 'ended'
+        if pos >= last or not self._mixer_has_queue:
+            return None
+        return self._track_ended()
+
+    def _advance_to_queued(self, queued):
+        """Memindahkan state ke lagu antrean yang sudah mulai berbunyi."""
+        self._cancel_queue()
+        song, context, commit = queued
+        if commit is not None:
+            commit()
+        previous_song = self.current_song
+        self.current_song = song
+        # get_pos mixer sudah dimulai ulang dari nol oleh lagu antrean, jadi cukup offset 0
+        self.clock.start()
+        print(f"▶️ Memutar: {song.title}")
+        self._song_started(song, context, previous_song)
 
     def play_prev_song(self):
         if not self.current_song: return
@@ -568,10 +1775,9 @@ class MusicPlayer:
         # 1. Logika jika berada di dalam Playlist (tetap sama)
         if isinstance(self.current_context, DoublyLinkedList):
             if self.is_shuffle:
-                all_songs = self.current_context.view_songs()
-                if not all_songs: self.is_playing = False; return
-                random_song = random.choice(all_songs)
-                self.play_song(random_song, context_playlist=self.current_context)
+                # Kembali ke lagu sebelumnya di riwayat shuffle; jika habis, ulang lagu ini
+                prev_song = self._shuffle_for(self.current_context).prev(self.current_song)
+                self.play_song(prev_song or self.current_song, context_playlist=self.current_context)
                 return
 
             # Urutan mundur sesuai linked list
@@ -584,10 +1790,8 @@ class MusicPlayer:
         else:
             # Jika Shuffle aktif
             if self.is_shuffle:
-                all_songs_list = list(self.song_library.values())
-                if not all_songs_list: self.is_playing = False; return
-                random_song = random.choice(all_songs_list)
-                self.play_song(random_song, context_playlist=None)
+                prev_song = self._shuffle_for('library').prev(self.current_song)
+                self.play_song(prev_song or self.current_song, context_playlist=None)
                 return
 
             # Jika Normal: Cari lagu mirip (sama seperti Next)
@@ -664,10 +1868,19 @@ class MusicPlayer:
             print(f"Error baca lirik: {e}")
             return None
 
+    @_mutation
     def user_delete_playlist(self, playlist_name):
         """Deletes a playlist by name."""
         if playlist_name in self.user_playlists:
-            del self.user_playlists[playlist_name]
-            self.save_data()
+            if self._batch_undo is not None:
+                playlist = self.user_playlists[playlist_name]
+                self._undo(self._restore_playlist, playlist_name, playlist.view_songs(),
+                           list(self.user_playlists).index(playlist_name),
+                           self.current_context is playlist, playlist.index_of_node(playlist.current_song_node))
+            playlist = self.user_playlists.pop(playlist_name)
+            playlist._detach_all()
+            if self.current_context is playlist:
+                self.current_context = 'library'  # Lanjutkan pemutaran dalam mode library
+            self._record('delete_playlist', name=playlist_name)
             return True, f"Playlist '{playlist_name}' deleted."
         return False, f"Playlist '{playlist_name}' not found."
\ No newline at end of file
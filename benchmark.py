@@ -0,0 +1,178 @@
+"""
+Backend Benchmarks
+Synthetic-library measurements for the data structures in backend.py.
+
+Usage:
+    python benchmark.py memory [--songs N]
+    python benchmark.py playlist [--sizes N N ...]
+    python benchmark.py delete [--playlists N] [--playlist-size N] [--deletes N]
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from backend import Song, DoublyLinkedList, MusicPlayer
+from storage import JournalStorage
+
+GENRES = ["Pop", "R&B", "Rock", "K-Pop", "Jazz", "Blues", "Ambient", "Indie"]
+
+
+class LegacySong:
+    """Dict-backed Song layout as it was before __slots__ and interning (for comparison)."""
+
+    def __init__(self, song_id, title, artist, album, genre, duration_seconds, file_path, image_path):
+        self.song_id = song_id
+        self.title = title
+        self.artist = artist
+        self.album = album
+        self.genre = genre
+        self.duration_seconds = duration_seconds
+        self.file_path = file_path
+        self.image_path = image_path
+        self.playlist_nodes = []
+
+
+def song_fields(i: int) -> tuple:
+    """
+    Fields for synthetic song `i`. Metadata strings are built fresh for every
+    song (as json.load would), with realistic repetition of artists/albums.
+    """
+    artist = "Artist " + str(i % 2000)
+    album = "Album " + str(i % 8000)
+    genre = "".join(GENRES[i % len(GENRES)])  # Salinan baru, bukan literal bersama
+    return (f"S{i:06d}", f"Title {i}", artist, album, genre, 120 + i % 240,
+            f"music/{i}.mp3", f"art/{i % 8000}.png")
+
+
+def build_library(song_cls, n: int) -> list:
+    return [song_cls(*song_fields(i)) for i in range(n)]
+
+
+def measure_bytes(song_cls, n: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    songs = build_library(song_cls, n)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del songs
+    return current
+
+
+def bench_memory(args):
+    print(f"Memory per song ({args.songs} songs)")
+    legacy = measure_bytes(LegacySong, args.songs)
+    compact = measure_bytes(Song, args.songs)
+    print(f"  before (dict + list):        {legacy / args.songs:8.1f} bytes/song")
+    print(f"  after  (__slots__ + intern): {compact / args.songs:8.1f} bytes/song")
+    print(f"  saved:                       {100.0 * (legacy - compact) / legacy:8.1f} %")
+
+
+def build_playlist(name: str, songs: list) -> DoublyLinkedList:
+    playlist = DoublyLinkedList(name)
+    with contextlib.redirect_stdout(io.StringIO()):  # add_song mencetak satu baris per lagu
+        for song in songs:
+            playlist.add_song(song)
+    return playlist
+
+
+def linear_find(playlist: DoublyLinkedList, song):
+    """The old head-to-tail scan of find_node_by_song, for comparison."""
+    current = playlist.head
+    while current:
+        if current.song == song:
+            return current
+        current = current.next
+    return None
+
+
+def time_per_call(fn, items: list) -> float:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items)
+
+
+def bench_playlist(args):
+    print("Playlist lookup / remove cost (microseconds per call)")
+    print(f"  {'size':>8}  {'find (map)':>12}  {'find (scan)':>12}  {'remove+add':>12}")
+    for size in args.sizes:
+        songs = build_library(Song, size)
+        playlist = build_playlist("bench", songs)
+        probes = random.sample(songs, min(200, size))
+
+        find_map = time_per_call(playlist.find_node_by_song, probes)
+        find_scan = time_per_call(lambda song: linear_find(playlist, song), probes[:20])
+
+        def remove_and_readd(song):
+            playlist.remove_song_by_user(song)
+            playlist.add_song(song)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            churn = time_per_call(remove_and_readd, probes)
+        print(f"  {size:>8}  {find_map * 1e6:>12.2f}  {find_scan * 1e6:>12.2f}  {churn * 1e6:>12.2f}")
+
+
+def bench_delete(args):
+    print(f"Cascade delete: {args.playlists} playlists x {args.playlist_size} songs")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage = JournalStorage(os.path.join(tmp_dir, "music_data.json"), compact_threshold=10 ** 9)
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Riwayat putar dan graf kNN juga di folder sementara, bukan file milik pengguna
+            player = MusicPlayer(storage=storage, play_history_path=os.path.join(tmp_dir, "music_plays.json"),
+                                 knn_path=os.path.join(tmp_dir, "music_knn.json"))
+            songs = build_library(Song, args.playlist_size * 4)
+            for song in songs:
+                player.song_library[song.song_id] = song
+
+            # Lagu yang akan dihapus ada di SEMUA playlist, sisanya diambil acak
+            victims = songs[:args.deletes]
+            for i in range(args.playlists):
+                members = victims + random.sample(songs[args.deletes:], args.playlist_size - args.deletes)
+                random.shuffle(members)
+                player.user_playlists[f"PL{i}"] = build_playlist(f"PL{i}", members)
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for song in victims:
+                player.admin_delete_song(song.song_id)
+        elapsed = time.perf_counter() - start
+
+        leftovers = sum(playlist.contains(song) for playlist in player.user_playlists.values() for song in victims)
+        print(f"  {elapsed / args.deletes * 1e3:.2f} ms per delete "
+              f"({args.playlists} nodes unlinked each), leftover nodes: {leftovers}")
+        storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Oceanova backend benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    memory = subparsers.add_parser("memory", help="bytes per Song before/after compaction")
+    memory.add_argument("--songs", type=int, default=100_000)
+    memory.set_defaults(func=bench_memory)
+
+    playlist = subparsers.add_parser("playlist", help="find/remove cost as playlists grow")
+    playlist.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    playlist.set_defaults(func=bench_playlist)
+
+    delete = subparsers.add_parser("delete", help="admin_delete_song on songs shared by many playlists")
+    delete.add_argument("--playlists", type=int, default=2_000)
+    delete.add_argument("--playlist-size", type=int, default=1_000)
+    delete.add_argument("--deletes", type=int, default=50)
+    delete.set_defaults(func=bench_delete)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -39,6 +39,12 @@ ctk.set_appearance_mode("dark")
 # --- PERBAIKAN: Kembali ke tema default untuk menghindari error ---
 ctk.set_default_color_theme("blue")
 
+PAGE_SIZE = 50  # Jumlah lagu per halaman di view library/playlist/pencarian
+SORT_OPTIONS = {"Default": None, "Judul": "title", "Artis": "artist", "Album": "album", "Durasi": "duration"}
+PROGRESS_MIN_INTERVAL_MS = 50  # Batas bawah jeda timer progres
+PROGRESS_MAX_INTERVAL_MS = 500  # Batas atas; label waktu per detik tetap terlihat mulus
+LYRICS_INTERVAL_MS = 100  # Presisi lirik saat Now Playing terbuka
+
 
 # =============================================================================
 # JENDELA UTAMA (USER VIEW)
@@ -83,6 +89,9 @@ class App(ctk.CTk):
             pass  # Lanjutkan tanpa crash
 
         self.player = MusicPlayer()
+        if self.visualizer_engine:
+            # Animasi visualizer mengikuti posisi lagu yang sama dengan slider dan lirik
+            self.visualizer_engine.set_position_source(self.player.get_current_playback_time)
         self.add_to_playlist_window = None
         self.username_var = ctk.StringVar(value=self.player.username)
         self.last_seek_time = 0.0
@@ -96,6 +105,11 @@ class App(ctk.CTk):
         self.admin_edit_image_path_var = ctk.StringVar(value="Pilih gambar baru (opsional)")
         self.loaded_song_id_to_edit = None
 
+        # Status halaman untuk daftar lagu (direset saat pindah ke view lain)
+        self.paged_view_key = None
+        self.view_sort = None
+        self.view_offset = 0
+
         self.default_art_image_small = self.load_image_safe(None, (80, 80), is_placeholder=True)
         self.default_art_image_large = self.load_image_safe(None, (400, 400), is_placeholder=True)
         self.default_art_image_history = self.load_image_safe(None, (40, 40), is_placeholder=True)
@@ -120,6 +134,7 @@ class App(ctk.CTk):
         self.current_lyrics = None  # Data lirik {waktu: teks}
         self.current_lyric_times = []  # List waktu untuk pencarian cepat
         self.current_lyric_text = "..."  # Teks yang sedang tampil
+        self.playback_job = None  # ID after() timer progres (None = tidak berjalan)
 
 
         # Konfigurasi grid utama
@@ -202,6 +217,13 @@ class App(ctk.CTk):
                                         hover_color=self.COLOR_PALETTE["card_hover"])
         self.search_btn.grid(row=0, column=1)
 
+        # Saran autocomplete muncul di bawah kotak pencarian saat mengetik
+        self.search_suggestion_frame = None
+        self.search_suggest_job = None
+        self.search_entry.bind("<KeyRelease>", self.on_search_key_release)
+        self.search_entry.bind("<Return>", lambda event: self.on_search())
+        self.search_entry.bind("<Escape>", lambda event: self.hide_search_suggestions())
+
         self.profile_frame = ctk.CTkFrame(self.header_frame, fg_color="transparent")
         self.profile_frame.grid(row=0, column=1, sticky="e")
 
@@ -362,9 +384,16 @@ class App(ctk.CTk):
         self.volume_percent_label.grid(row=0, column=5, padx=(0, 10))
 
         self.create_now_playing_view()
-        self.update_progress()
         self.show_dashboard()
         self.update_history_sidebar()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        """Simpan perubahan yang masih tertunda sebelum jendela ditutup."""
+        self.player.flush()
+        if self.visualizer_engine:
+            self.visualizer_engine.stop()
+        self.destroy()
 
 
         # --- FUNGSI BARU: Untuk memuat gambar dengan aman ---
@@ -598,8 +627,36 @@ class App(ctk.CTk):
         secs = int(seconds % 60)
         return f"{mins:02}:{secs:02}"
 
+    def _schedule_playback_tick(self):
+        """Menyalakan timer progres jika ada lagu yang berbunyi (tidak ada timer saat diam/pause)."""
+        if self.playback_job is None and self.player.is_playing:
+            self.playback_job = self.after(0, self.update_progress)
+
+    def _progress_interval(self):
+        """Jeda timer: selama satu piksel slider, lebih rapat untuk lirik, dan bangun saat lagu diperkirakan habis."""
+        duration = self.player.current_song.duration_seconds or 0
+        slider_width = max(self.slider.winfo_width(), 1)
+        interval = duration * 1000 / slider_width
+        if self.current_lyrics and self.now_playing_frame.winfo_ismapped():
+            interval = min(interval, LYRICS_INTERVAL_MS)
+        remaining_ms = (duration - self.player.get_current_playback_time()) * 1000
+        if remaining_ms > 0:
+            interval = min(interval, remaining_ms)
+        return int(min(max(interval, PROGRESS_MIN_INTERVAL_MS), PROGRESS_MAX_INTERVAL_MS))
+
     def update_progress(self):
-        if self.player.is_playing and self.player.current_song and not self.is_slider_seeking:
+        self.playback_job = None
+        # Notifikasi akhir lagu dari mixer (event, bukan tebakan dari durasi metadata)
+        event = self.player.pump_events()
+        if event == 'advanced':
+            # Mixer sudah menyambung sendiri ke lagu di antrean (gapless): GUI cukup mengikuti
+            self._on_track_changed()
+        elif event == 'ended':
+            self.on_next_click()
+        if not self.player.is_playing or not self.player.current_song:
+            return  # Timer berhenti; dinyalakan lagi saat pemutaran dimulai/dilanjutkan
+
+        if not self.is_slider_seeking:
             total_duration = self.player.current_song.duration_seconds
             current_time = self.player.get_current_playback_time()
             # --- BARU: Logika Lirik ---
@@ -627,18 +684,17 @@ class App(ctk.CTk):
                     # Hanya update jika Now Playing sedang dibuka
                     if self.now_playing_frame.winfo_ismapped():
                         self.np_lyrics_label.configure(text=display_text)
-            if current_time < total_duration:
-                current_time_str = self.format_time(current_time)
-                self.time_start_label.configure(text=current_time_str)
-                self.np_time_start_label.configure(text=current_time_str)
-
-                slider_pos = current_time / total_duration
-                self.slider.set(slider_pos)
-                self.np_slider.set(slider_pos)
-            else:
-                if self.player.repeat_mode != "one":
-                    self.on_next_click()
-        self.after(100, self.update_progress)
+            # Metadata durasi bisa lebih pendek dari file: tahan di ujung sampai mixer selesai
+            current_time = min(current_time, total_duration)
+            current_time_str = self.format_time(current_time)
+            self.time_start_label.configure(text=current_time_str)
+            self.np_time_start_label.configure(text=current_time_str)
+
+            slider_pos = current_time / total_duration if total_duration else 0
+            self.slider.set(slider_pos)
+            self.np_slider.set(slider_pos)
+        if self.playback_job is None:
+            self.playback_job = self.after(self._progress_interval(), self.update_progress)
 
     def on_slider_press(self, event):
         self.is_slider_seeking = True
@@ -761,14 +817,17 @@ class App(ctk.CTk):
         genre_frame._scrollbar.configure(height=0)
         genre_frame.pack(fill="x", padx=10, pady=5)
 
-        genres = ["All", "Pop", "R&B", "Rock", "K-Pop", "Jazz", "Blues", "Ambient", "Indie"]
+        # Genre diambil dari index genre di backend, lengkap dengan jumlah lagunya
+        genres = [("All", len(self.player.song_library))] + self.player.get_genres()
         self.genre_buttons = {}
-        for genre in genres:
-            btn = ctk.CTkButton(genre_frame, text=genre, font=ctk.CTkFont(size=14, weight="bold"), fg_color=self.COLOR_PALETTE["card_bg"], height=40,
+        for genre, count in genres:
+            btn = ctk.CTkButton(genre_frame, text=f"{genre} ({count})", font=ctk.CTkFont(size=14, weight="bold"), fg_color=self.COLOR_PALETTE["card_bg"], height=40,
                                 hover_color=self.COLOR_PALETTE["card_hover"],
                                 command=lambda g=genre: self.on_genre_filter(g))
             btn.pack(side="left", padx=5, anchor="w")
             self.genre_buttons[genre] = btn
+        if self.current_genre_filter not in self.genre_buttons:
+            self.current_genre_filter = "All"  # Genre terakhir sudah tidak punya lagu
 
         self.card_scroll_frame = ctk.CTkScrollableFrame(self.content_frame, orientation="horizontal", height=250,
                                                         fg_color="transparent")
@@ -787,12 +846,56 @@ class App(ctk.CTk):
 
         self.clear_content_frame()
         self.main_title_label.configure(text="All Songs in Library")
-        all_songs = self.player.song_library.values()
-        if not all_songs:
-            ctk.CTkLabel(self.content_frame, text="Library kosong.").pack(fill="x", padx=10)
+        self._render_song_page("library", self.player.get_library_page, None, self.show_library,
+                               "Library kosong.")
+
+    def _render_song_page(self, view_key, fetch_page, context_playlist, rerender, empty_text):
+        """Menampilkan satu halaman lagu (fetch_page(sort=, offset=, limit=)) beserta pilihan urutan & navigasi."""
+        if view_key != self.paged_view_key:
+            self.paged_view_key = view_key
+            self.view_sort = None
+            self.view_offset = 0
+
+        page = fetch_page(sort=self.view_sort, offset=self.view_offset, limit=PAGE_SIZE)
+        if page['total'] and self.view_offset >= page['total']:
+            # Halaman ini kosong setelah ada lagu yang dihapus: mundur ke halaman terakhir
+            self.view_offset = (page['total'] - 1) // PAGE_SIZE * PAGE_SIZE
+            page = fetch_page(sort=self.view_sort, offset=self.view_offset, limit=PAGE_SIZE)
+        if not page['total']:
+            ctk.CTkLabel(self.content_frame, text=empty_text).pack(fill="x", padx=10)
             return
-        for song in all_songs:
-            self.create_song_widget(self.content_frame, song, context_playlist=None)
+
+        def change_page(sort=None, offset=0):
+            self.view_sort = sort
+            self.view_offset = offset
+            rerender()
+
+        toolbar = ctk.CTkFrame(self.content_frame, fg_color="transparent")
+        toolbar.pack(fill="x", pady=(0, 5))
+        sort_label = next(label for label, value in SORT_OPTIONS.items() if value == self.view_sort)
+        ctk.CTkOptionMenu(toolbar, values=list(SORT_OPTIONS), width=110,
+                          variable=ctk.StringVar(value=sort_label),
+                          fg_color=self.COLOR_PALETTE["card_bg"], button_color=self.COLOR_PALETTE["card_hover"],
+                          command=lambda label: change_page(SORT_OPTIONS[label], 0)).pack(side="left")
+
+        first, last = self.view_offset + 1, self.view_offset + len(page['songs'])
+        next_btn = ctk.CTkButton(toolbar, text="▶", width=30, fg_color=self.COLOR_PALETTE["card_bg"],
+                                 hover_color=self.COLOR_PALETTE["card_hover"],
+                                 command=lambda: change_page(self.view_sort, self.view_offset + PAGE_SIZE))
+        next_btn.pack(side="right")
+        ctk.CTkLabel(toolbar, text=f"{first}–{last} dari {page['total']}",
+                     text_color=self.COLOR_PALETTE["text_secondary"]).pack(side="right", padx=10)
+        prev_btn = ctk.CTkButton(toolbar, text="◀", width=30, fg_color=self.COLOR_PALETTE["card_bg"],
+                                 hover_color=self.COLOR_PALETTE["card_hover"],
+                                 command=lambda: change_page(self.view_sort, max(0, self.view_offset - PAGE_SIZE)))
+        prev_btn.pack(side="right")
+        if self.view_offset == 0:
+            prev_btn.configure(state="disabled")
+        if last >= page['total']:
+            next_btn.configure(state="disabled")
+
+        for song in page['songs']:
+            self.create_song_widget(self.content_frame, song, context_playlist=context_playlist)
 
     def show_playlists(self):
         self._reset_sidebar_buttons()
@@ -882,12 +985,10 @@ class App(ctk.CTk):
         add_song_btn.grid(row=0, column=2, padx=10, sticky="e")
         # --- Akhir Frame Header ---
 
-        songs = playlist_obj.view_songs()
-        if not songs:
-            ctk.CTkLabel(self.content_frame, text="Playlist ini kosong.").pack(fill="x", padx=10)
-            return
-        for song in songs:
-            self.create_song_widget(self.content_frame, song, context_playlist=playlist_obj)
+        self._render_song_page(f"playlist:{playlist_obj.name}",
+                               lambda **page: self.player.get_playlist_page(playlist_obj.name, **page),
+                               playlist_obj, lambda: self.show_playlist_songs(playlist_obj),
+                               "Playlist ini kosong.")
 
     def show_favourites(self):
         self._reset_sidebar_buttons()
@@ -1219,7 +1320,7 @@ class App(ctk.CTk):
         song_label = ctk.CTkLabel(song_frame, text=info, anchor="w", text_color=self.COLOR_PALETTE["text_primary"])
         song_label.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
 
-        is_favourite = song in self.player.favourite_playlist.view_songs()
+        is_favourite = self.player.is_favourite(song)
         like_text = "❤" if is_favourite else "♡"
         # 3. Ganti warna tombol 'like'
         like_color = self.COLOR_PALETTE["accent_pink"] if is_favourite else self.COLOR_PALETTE["text_secondary"]
@@ -1289,7 +1390,7 @@ class App(ctk.CTk):
         artist.pack(anchor="w")
 
         # Tombol 'Like'
-        is_favourite = song in self.player.favourite_playlist.view_songs()
+        is_favourite = self.player.is_favourite(song)
         like_text = "❤" if is_favourite else "♡"
         like_color = self.COLOR_PALETTE["accent_pink"] if is_favourite else self.COLOR_PALETTE["text_secondary"]
 
@@ -1491,18 +1592,11 @@ class App(ctk.CTk):
         # 1. Coba cari berdasarkan ID Persis
         song = self.player.get_song_by_id(query)
 
-        # 2. Jika tidak ketemu, cari secara luas (ID case-insensitive, Judul, Artis, Album, Genre)
+        # 2. Jika tidak ketemu, cari secara luas lewat index pencarian (ID, Judul, Artis, Album, Genre)
         if not song:
-            query_lower = query.lower()
-            for s in self.player.song_library.values():
-                # Cek apakah query ada di dalam salah satu atribut lagu
-                if (s.song_id.lower() == query_lower or
-                        query_lower in s.title.lower() or
-                        query_lower in s.artist.lower() or
-                        query_lower in s.album.lower() or
-                        query_lower in s.genre.lower()):
-                    song = s
-                    break  # Ambil yang pertama ketemu
+            matches = self.player.user_search_song(query)
+            if matches:
+                song = matches[0]  # Ambil yang pertama ketemu
 
         if song:
             self.loaded_song_id_to_edit = song.song_id  # Penting: Simpan ID aslinya
@@ -1669,17 +1763,58 @@ class App(ctk.CTk):
         for song in songs:
             self.create_song_card(self.card_scroll_frame, song)
 
+    def on_search_key_release(self, event):
+        if event.keysym in ("Return", "Escape"):
+            return
+        # Debounce: saran dihitung sekali setelah jeda mengetik, bukan tiap tombol
+        if self.search_suggest_job is not None:
+            self.after_cancel(self.search_suggest_job)
+        self.search_suggest_job = self.after(120, self.update_search_suggestions)
+
+    def update_search_suggestions(self):
+        self.search_suggest_job = None
+        suggestions = self.player.get_search_suggestions(self.search_entry.get())
+        if not suggestions:
+            self.hide_search_suggestions()
+            return
+
+        if self.search_suggestion_frame is None:
+            self.search_suggestion_frame = ctk.CTkFrame(self, fg_color=self.COLOR_PALETTE["card_bg"],
+                                                        corner_radius=8)
+        for widget in self.search_suggestion_frame.winfo_children():
+            widget.destroy()
+        for text in suggestions:
+            ctk.CTkButton(self.search_suggestion_frame, text=text, anchor="w", height=28,
+                          fg_color="transparent", hover_color=self.COLOR_PALETTE["card_hover"],
+                          text_color=self.COLOR_PALETTE["text_primary"],
+                          command=lambda t=text: self.on_search_suggestion_selected(t)).pack(fill="x", padx=4,
+                                                                                              pady=1)
+
+        x = self.search_entry.winfo_rootx() - self.winfo_rootx()
+        y = self.search_entry.winfo_rooty() - self.winfo_rooty() + self.search_entry.winfo_height() + 2
+        self.search_suggestion_frame.place(x=x, y=y, width=self.search_entry.winfo_width())
+        self.search_suggestion_frame.lift()
+
+    def hide_search_suggestions(self):
+        if self.search_suggest_job is not None:
+            self.after_cancel(self.search_suggest_job)
+            self.search_suggest_job = None
+        if self.search_suggestion_frame is not None:
+            self.search_suggestion_frame.place_forget()
+
+    def on_search_suggestion_selected(self, text):
+        self.search_entry.delete(0, "end")
+        self.search_entry.insert(0, text)
+        self.on_search()
+
     def on_search(self):
+        self.hide_search_suggestions()
         self.clear_content_frame()
         self.main_title_label.configure(text="Search Results")
         query = self.search_entry.get()
         if not query: return
-        results = self.player.user_search_song(query)
-        if not results:
-            ctk.CTkLabel(self.content_frame, text="Tidak ada hasil.").pack()
-            return
-        for song in results:
-            self.create_song_widget(self.content_frame, song, context_playlist=None)
+        self._render_song_page(f"search:{query}", lambda **page: self.player.search_page(query, **page),
+                               None, self.on_search, "Tidak ada hasil.")
 
     def on_toggle_favourite(self, song):
         self.player.toggle_favourite(song)
@@ -1759,37 +1894,34 @@ class App(ctk.CTk):
 
     def on_play_song(self, song_object, context_playlist=None):
         self.player.play_song(song_object, context_playlist=context_playlist)
+        self._on_track_changed()
+
+    def _on_track_changed(self):
+        """Reset lirik, slider dan info lagu setelah lagu yang berbunyi berganti."""
         self.current_lyrics = None
         self.current_lyric_times = []
-        self.np_lyrics_label.configure(text="Searching lyrics...")  # Tanda loading
-
-        # Panggil download di background
-        self.player.download_lyrics_background(song_object)
+        if self.player.current_song:
+            self.np_lyrics_label.configure(text="Searching lyrics...")  # Tanda loading
+            # Panggil download di background
+            self.player.download_lyrics_background(self.player.current_song)
         self.slider.set(0)
         self.np_slider.set(0)
         self.update_player_ui()
         self.update_history_sidebar()
+        self._schedule_playback_tick()
 
     def on_play_pause_click(self):
-        current_time = self.player.get_current_playback_time()
         self.player.stop_song()
-        if not self.player.is_playing:
-            self.player.current_seek_time = current_time
         self.update_player_ui()
+        self._schedule_playback_tick()
 
     def on_next_click(self):
         self.player.play_next_song()
-        self.slider.set(0)
-        self.np_slider.set(0)
-        self.update_player_ui()
-        self.update_history_sidebar()
+        self._on_track_changed()
 
     def on_prev_click(self):
         self.player.play_prev_song()
-        self.slider.set(0)
-        self.np_slider.set(0)
-        self.update_player_ui()
-        self.update_history_sidebar()
+        self._on_track_changed()
 
     def update_player_ui(self):
         # Tentukan warna tombol play/pause
@@ -1877,10 +2009,8 @@ class App(ctk.CTk):
             ctk.CTkLabel(scroll_frame, text="Library kosong.").pack(pady=20)
             return
 
-        current_song_ids = {song.song_id for song in target_playlist.view_songs()}
-
         for i, song in enumerate(all_songs):
-            is_in_playlist = song.song_id in current_song_ids
+            is_in_playlist = self.player.playlist_contains(target_playlist.name, song)
 
             song_item = ctk.CTkFrame(scroll_frame, fg_color=self.COLOR_PALETTE["card_bg"])
             song_item.grid(row=i, column=0, sticky="ew", pady=3)
@@ -1899,7 +2029,7 @@ class App(ctk.CTk):
             artist_label.grid(row=1, column=1, sticky="w", padx=5)
 
             # --- BARU: Tombol 'Like' ---
-            is_favourite = song in self.player.favourite_playlist.view_songs()
+            is_favourite = self.player.is_favourite(song)
             like_text = "❤️" if is_favourite else "♡"
             like_color = self.COLOR_PALETTE["accent_pink"] if is_favourite else self.COLOR_PALETTE["text_secondary"]
 
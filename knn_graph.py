@@ -0,0 +1,323 @@
+"""
+Nearest-Neighbour Graph
+Precomputed top-k similar songs per song, so "play something similar" is a
+dictionary lookup instead of a pass over the whole library. Built from a
+SimilarityEngine in a background thread, kept current by local updates on
+add/update/delete, and saved to disk between sessions.
+"""
+
+import itertools
+import json
+import os
+import threading
+import zlib
+
+from storage import write_json_atomic
+
+DEFAULT_K = 10
+BUILD_CHUNK = 64  # Lagu per perkalian matriks saat build (64 x 100rb skor float32 ~ 25 MB)
+GRAPH_VERSION = 1
+
+
+def library_fingerprint(songs, audio_vectors=None, history_version=None) -> int:
+    """
+    Order-independent checksum of what the similarity vectors depend on: song
+    fields, audio vectors and a version of the play history behind the
+    co-occurrence contexts (PlayHistory.version(), so the history is not read).
+    """
+    audio_vectors = audio_vectors or {}
+    fingerprint = 0
+    for song in songs:
+        signature = f"{song.song_id}|{song.artist}|{song.genre}|{song.duration_seconds}"
+        vector = audio_vectors.get(song.song_id)
+        if vector is not None:
+            signature += "|" + ",".join(f"{value:.3f}" for value in vector)
+        fingerprint ^= zlib.crc32(signature.encode("utf-8"))
+    if history_version is not None:
+        fingerprint ^= zlib.crc32(repr(history_version).encode("utf-8"))
+    return fingerprint
+
+
+class _Computation:
+    """Songs being scored outside the lock, and what happened to the graph meanwhile."""
+
+    __slots__ = ('song_ids', 'inserts', 'touched')
+
+    def __init__(self, song_ids):
+        self.song_ids = set(song_ids)
+        self.inserts = {}  # song_id -> [(id lagu baru, skor)] dari add() selama perhitungan
+        self.touched = set()  # Lagu yang vektornya berubah atau dihapus selama perhitungan
+
+
+class KnnGraph:
+    """
+    song_id -> [(neighbour_id, score), ...] best first, at most k entries.
+
+    Lists are filled by the background build, loaded from disk, or computed on
+    first use. Local maintenance keeps them exact without a rebuild:
+      - add: one scoring pass gives the new song's list and every song it
+        should now appear in (cosine is symmetric);
+      - update (metadata edit): songs that listed it are marked stale, then
+        it is re-added;
+      - update_async (new play transition, a small change): the same update,
+        run later by the background worker; the old lists stay in use until then;
+      - remove: songs that listed it are marked stale.
+    A stale list keeps being served (minus removed songs) until the
+    background worker recomputes it, so a lookup stays O(k).
+
+    All public methods take `lock` (the player's state lock), so the build
+    thread and the UI thread never see a half-updated graph. The build, the
+    worker and a first-use lookup score songs without holding it: the lock is
+    taken to capture a ScoreQuery and again to store the result. Adds,
+    updates and removes that happen in between are recorded against the
+    running computation and folded in (or the list is marked stale) then.
+    """
+
+    def __init__(self, engine, k: int = DEFAULT_K, min_score: float = 0.0, lock=None):
+        self.engine = engine
+        self.k = k
+        self.min_score = min_score
+        self._lock = lock if lock is not None else threading.RLock()
+        self._neighbours = {}
+        self._referrers = {}  # song_id -> set song yang mencantumkannya di daftar tetangga
+        self._stale = set()
+        self._queued = set()  # Lagu yang menunggu update() oleh worker background
+        self._computations = []  # _Computation yang sedang dihitung di luar lock
+        self.changed = False  # Ada perubahan sejak terakhir dimuat/disimpan
+        self._cancelled = threading.Event()
+        self._build_thread = None
+
+    def __len__(self):
+        return len(self._neighbours)
+
+    # --- Query ---
+    def neighbours(self, song_id: str) -> list:
+        with self._lock:
+            current = self._neighbours.get(song_id)
+            if current is not None:
+                if song_id not in self._stale:
+                    return current
+                # Daftar usang tetap dipakai sampai worker menghitungnya ulang
+                self.start_background_build()
+                return [pair for pair in current if pair[0] in self.engine]
+            if song_id not in self.engine:
+                return []
+            computation, query = self._begin([song_id])
+        lists = query.top_k(self.k, self.min_score)
+        with self._lock:
+            self._finish(computation, lists)
+            return self._neighbours.get(song_id, lists.get(song_id, []))
+
+    # --- Mutasi (dipanggil setelah engine diperbarui) ---
+    def add(self, song_id: str):
+        with self._lock:
+            self._add_scored(song_id, self.engine.similar_above(song_id, self.min_score))
+
+    def update(self, song_id: str):
+        with self._lock:
+            self._touch(song_id)
+            self.invalidate_referrers(song_id)
+            self.add(song_id)
+
+    def update_async(self, song_ids):
+        """update() each song on the background worker instead of the caller's thread."""
+        with self._lock:
+            self._queued.update(song_ids)
+        self.start_background_build()
+
+    def remove(self, song_id: str):
+        with self._lock:
+            self._touch(song_id)
+            self.invalidate_referrers(song_id)
+            self._set(song_id, None)
+            self._referrers.pop(song_id, None)
+
+    def invalidate_referrers(self, song_id: str):
+        with self._lock:
+            self._stale.update(self._referrers.get(song_id, ()))
+
+    # --- Build di background ---
+    def start_background_build(self, on_done=None):
+        """
+        Fill every missing list in a daemon thread, a chunk at a time, then
+        drain the update_async queue and the stale lists.
+        """
+        with self._lock:
+            if self._build_thread is not None and self._build_thread.is_alive():
+                return
+            self._build_thread = threading.Thread(target=self._run_build, args=(on_done,), daemon=True)
+            self._build_thread.start()
+
+    def _run_build(self, on_done):
+        full_build = len(self._neighbours) < len(self.engine)
+        if full_build:
+            song_ids = self.engine.song_ids()
+            for start in range(0, len(song_ids), BUILD_CHUNK):
+                if self._cancelled.is_set():
+                    return
+                with self._lock:
+                    # Lagu yang dihapus/diisi selama build dilewati; yang baru ditambahkan sudah diisi add()
+                    chunk = [song_id for song_id in song_ids[start:start + BUILD_CHUNK]
+                             if song_id in self.engine
+                             and (song_id not in self._neighbours or song_id in self._stale)]
+                    if not chunk:
+                        continue
+                    computation, query = self._begin(chunk)
+                lists = query.top_k(self.k, self.min_score)
+                with self._lock:
+                    self._finish(computation, lists)
+        while not self._cancelled.is_set():
+            with self._lock:
+                if self._queued:
+                    song_id = self._queued.pop()
+                    if song_id not in self.engine:
+                        continue
+                    computation, query = self._begin([song_id])
+                    chunk = None
+                else:
+                    chunk = list(itertools.islice(self._stale, BUILD_CHUNK))
+                    if not chunk:
+                        # Dilepas di bawah lock: update_async sesudah ini pasti memulai worker baru
+                        self._build_thread = None
+                        break
+                    self._stale.difference_update(chunk)
+                    computation, query = self._begin([song_id for song_id in chunk if song_id in self.engine])
+            if chunk is None:
+                candidates = query.above(self.min_score).get(song_id, [])
+                with self._lock:
+                    self._finish_update(computation, song_id, candidates)
+            else:
+                lists = query.top_k(self.k, self.min_score)
+                with self._lock:
+                    self._finish(computation, lists)
+        if full_build:
+            print(f"Graf lagu mirip selesai dibangun: {len(self._neighbours)} lagu")
+        if on_done is not None:
+            on_done()
+
+    def rebuild(self, on_done=None):
+        """Drop every list (many vectors changed at once) and build again in the background."""
+        with self._lock:
+            self._neighbours.clear()
+            self._referrers.clear()
+            self._stale.clear()
+            self._queued.clear()
+            for computation in self._computations:
+                computation.touched.update(computation.song_ids)  # Hasilnya dari vektor lama
+            self.changed = True
+        self.start_background_build(on_done)
+
+    def cancel(self):
+        """Stop a running build (the graph is being replaced)."""
+        self._cancelled.set()
+
+    def is_building(self) -> bool:
+        thread = self._build_thread
+        return thread is not None and thread.is_alive()
+
+    # --- Disk ---
+    def save(self, path: str, fingerprint: int):
+        with self._lock:
+            self.changed = False
+            neighbours = {song_id: [[other_id, round(score, 4)] for other_id, score in pairs]
+                          for song_id, pairs in self._neighbours.items()
+                          if song_id not in self._stale and song_id not in self._queued}
+        write_json_atomic(path, {'version': GRAPH_VERSION, 'k': self.k, 'min_score': self.min_score,
+                                 'fingerprint': fingerprint, 'neighbours': neighbours}, indent=None)
+
+    def load(self, path: str, fingerprint: int) -> bool:
+        """Take the lists saved at `path` if they were built for this library and settings."""
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Graf lagu mirip tidak bisa dibaca: {e}")
+            return False
+        if (data.get('version') != GRAPH_VERSION or data.get('k') != self.k
+                or data.get('min_score') != self.min_score or data.get('fingerprint') != fingerprint):
+            return False
+        with self._lock:
+            for song_id, pairs in data.get('neighbours', {}).items():
+                if song_id in self.engine:
+                    self._set(song_id, [(other_id, score) for other_id, score in pairs
+                                        if other_id in self.engine])
+            self.changed = False
+        return True
+
+    # --- Helper internal ---
+    def _begin(self, song_ids):
+        """Start scoring `song_ids` outside the lock. Caller holds the lock."""
+        computation = _Computation(song_ids)
+        self._computations.append(computation)
+        return computation, self.engine.query(song_ids)
+
+    def _finish(self, computation, lists: dict):
+        """Store lists scored outside the lock, corrected for what changed meanwhile. Caller holds the lock."""
+        self._computations.remove(computation)
+        touched = computation.touched
+        for song_id, neighbours in lists.items():
+            if song_id not in self.engine:
+                continue
+            if song_id in touched:
+                self._stale.add(song_id)  # Vektornya sendiri berubah: hitung ulang
+                continue
+            kept = [pair for pair in neighbours if pair[0] not in touched and pair[0] in self.engine]
+            # Daftar penuh yang kehilangan tetangga mungkin punya pengganti di luar k teratas
+            incomplete = len(kept) < len(neighbours) and len(neighbours) == self.k
+            inserts = computation.inserts.get(song_id)
+            if inserts:
+                merged = dict(kept)
+                merged.update(inserts)
+                kept = sorted(merged.items(), key=lambda pair: pair[1], reverse=True)[:self.k]
+            self._set(song_id, kept)
+            if incomplete:
+                self._stale.add(song_id)
+
+    def _finish_update(self, computation, song_id: str, candidates: list):
+        """update() with a similar_above pass scored outside the lock. Caller holds the lock."""
+        self._computations.remove(computation)
+        if song_id not in self.engine:
+            return
+        if song_id in computation.touched:
+            self._queued.add(song_id)  # Berubah lagi selama dihitung: ulangi
+            return
+        # Kandidat lengkap: lagu yang berubah selama dihitung sudah masuk lewat inserts
+        kept = [pair for pair in candidates if pair[0] not in computation.touched and pair[0] in self.engine]
+        self._touch(song_id)
+        self.invalidate_referrers(song_id)
+        self._add_scored(song_id, kept + computation.inserts.get(song_id, []))
+
+    def _add_scored(self, song_id: str, candidates: list):
+        candidates.sort(key=lambda pair: pair[1], reverse=True)
+        self._set(song_id, candidates[:self.k])
+        for computation in self._computations:
+            for other_id, score in candidates:
+                if other_id in computation.song_ids:
+                    computation.inserts.setdefault(other_id, []).append((song_id, score))
+        for other_id, score in candidates:
+            current = self._neighbours.get(other_id)
+            if current is None or other_id in self._stale:
+                continue
+            if len(current) < self.k or score > current[-1][1]:
+                self._set(other_id, sorted(current + [(song_id, score)],
+                                           key=lambda pair: pair[1], reverse=True)[:self.k])
+
+    def _touch(self, song_id: str):
+        for computation in self._computations:
+            computation.touched.add(song_id)
+
+    def _set(self, song_id: str, neighbours):
+        self.changed = True
+        for other_id, _ in self._neighbours.get(song_id, ()):
+            referrers = self._referrers.get(other_id)
+            if referrers is not None:
+                referrers.discard(song_id)
+        self._stale.discard(song_id)
+        if neighbours is None:
+            self._neighbours.pop(song_id, None)
+            return
+        self._neighbours[song_id] = neighbours
+        for other_id, _ in neighbours:
+            self._referrers.setdefault(other_id, set()).add(song_id)
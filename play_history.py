@@ -0,0 +1,205 @@
+"""
+Play History Model
+Persistent log of play events and a sparse song -> next-song transition
+matrix learned from it, so "what usually follows this song" survives
+restarts. Recent listening counts more than old listening.
+"""
+
+import heapq
+import json
+import os
+import threading
+import time
+
+from storage import BackgroundCompaction, append_json_lines, read_json_lines, rewrite_json_lines, write_json_atomic
+
+HALF_LIFE_PLAYS = 200  # Setelah 200 putaran berikutnya, bobot sebuah transisi tinggal setengah
+SESSION_GAP = 30 * 60  # Dua putaran berjarak lebih dari ini (detik) tidak dihitung sebagai transisi
+MAX_SUCCESSORS = 32  # Lagu penerus yang disimpan per lagu (yang bobotnya terkecil dibuang)
+COMPACT_THRESHOLD = 1000  # Jumlah event di log sebelum dilipat ke snapshot
+RESCALE_EXPONENT = 40  # Bobot dinormalisasi ulang sebelum 2**eksponen terlalu besar
+
+
+class PlayHistory:
+    """
+    Transition counts between consecutively played songs, decayed by recency.
+
+    Every play is appended to a log (one JSON line); the matrix lives in a
+    snapshot that the log is folded into every `compact_threshold` events, the
+    same snapshot + journal scheme as JournalStorage. Nothing is read until the
+    model is first queried: plays (and forgotten songs) recorded before that
+    are only appended, and replayed in order on load.
+
+    Decay is per play, not per wall-clock time, and costs nothing per event:
+    the n-th event adds 2**(n / half_life) instead of shrinking every older
+    weight, and all weights are divided down once the exponent gets large.
+    Rows are capped at `max_successors`, so a query is O(k) whatever the
+    library size.
+    """
+
+    def __init__(self, path: str, log_path: str = None, half_life: int = HALF_LIFE_PLAYS,
+                 session_gap: float = SESSION_GAP, max_successors: int = MAX_SUCCESSORS,
+                 compact_threshold: int = COMPACT_THRESHOLD):
+        self.path = path
+        self.log_path = log_path or os.path.splitext(path)[0] + ".log"
+        self.half_life = half_life
+        self.session_gap = session_gap
+        self.max_successors = max_successors
+        self.compact_threshold = compact_threshold
+
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._rows = {}  # song_id -> {song_id penerus: bobot}
+        self._predecessors = {}  # song_id -> set lagu yang barisnya memuat song_id (untuk forget)
+        self._events = 0  # Jumlah event sejak awal
+        self._offset = 0  # Nilai _events saat bobot terakhir dinormalisasi ulang
+        self._last = None  # (song_id, timestamp) putaran terakhir
+        self._pending = 0  # Event di log yang belum masuk snapshot
+        self._compaction = BackgroundCompaction("Error kompaksi riwayat putar")
+
+    # --- Mutasi ---
+    def record_play(self, song_id: str, timestamp: float = None):
+        """Append a play event; if the model is loaded, fold it in as well."""
+        timestamp = time.time() if timestamp is None else timestamp
+        self._log_event({'song_id': song_id, 't': timestamp})
+
+    def forget_song(self, song_id: str):
+        """Drop every transition from or to the song, so an ID reused later starts with no history."""
+        self._log_event({'forget': song_id})
+
+    # --- Query ---
+    def successors(self, song_id: str, k: int = 10) -> list:
+        """[(song_id, weight), ...] of the k songs most often played after `song_id`, weight in (0, 1]."""
+        with self._lock:
+            self._ensure_loaded()
+            row = self._rows.get(song_id)
+            if not row:
+                return []
+            best = heapq.nlargest(k, row.items(), key=lambda item: item[1])
+        top_weight = best[0][1]
+        return [(next_id, weight / top_weight) for next_id, weight in best]
+
+    def transitions(self) -> list:
+        """[(song_id, next_song_id, weight), ...] for every kept transition; weight 1.0 = one play just now."""
+        with self._lock:
+            self._ensure_loaded()
+            now = 2.0 ** ((self._events - self._offset) / self.half_life)
+            return [(song_id, next_id, weight / now)
+                    for song_id, row in self._rows.items() for next_id, weight in row.items()]
+
+    def version(self) -> tuple:
+        """
+        Cheap token that changes whenever the stored history does, read from the
+        snapshot and log file stats without loading either.
+        """
+        stats = []
+        for path in (self.path, self.log_path):
+            try:
+                stat = os.stat(path)
+                stats.append((stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                stats.append(None)
+        return tuple(stats)
+
+    # --- Persistensi ---
+    def compact_async(self):
+        """Fold the log into a new snapshot on a background thread."""
+        if self._compaction.running():
+            return
+        with self._lock:
+            data = self._snapshot()
+            covered = self._pending
+            self._pending = 0
+
+        def run_compaction():
+            write_json_atomic(self.path, data, indent=None)
+            with self._lock:
+                # Event pertama `covered` sudah ada di snapshot
+                rewrite_json_lines(self.log_path, read_json_lines(self.log_path)[covered:])
+
+        self._compaction.start(run_compaction)
+
+    def flush(self):
+        """Wait for a running compaction (the log itself is written synchronously)."""
+        self._compaction.join()
+
+    # --- Helper internal ---
+    def _log_event(self, event: dict):
+        with self._lock:
+            append_json_lines(self.log_path, [event])
+            self._pending += 1
+            if self._loaded:
+                self._replay(event)
+            should_compact = self._loaded and self._pending >= self.compact_threshold
+        if should_compact:
+            self.compact_async()
+
+    def _replay(self, event: dict):
+        if 'forget' in event:
+            self._forget(event['forget'])
+        else:
+            self._apply(event['song_id'], event['t'])
+
+    def _ensure_loaded(self):
+        """Read the snapshot and replay the log. Caller holds the lock."""
+        if self._loaded:
+            return
+        self._loaded = True
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                self._rows = data.get('rows', {})
+                for song_id, row in self._rows.items():
+                    for next_id in row:
+                        self._predecessors.setdefault(next_id, set()).add(song_id)
+                self._events = data.get('events', 0)
+                self._offset = data.get('offset', 0)
+                self._last = tuple(data['last']) if data.get('last') else None
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Riwayat putar tidak bisa dibaca: {e}. Memulai dari kosong.")
+        self._pending = 0
+        for event in read_json_lines(self.log_path):
+            self._replay(event)
+            self._pending += 1
+
+    def _apply(self, song_id: str, timestamp: float):
+        previous = self._last
+        self._last = (song_id, timestamp)
+        self._events += 1
+        if previous is None or previous[0] == song_id or timestamp - previous[1] > self.session_gap:
+            return
+        exponent = (self._events - self._offset) / self.half_life
+        if exponent > RESCALE_EXPONENT:
+            self._rescale(2.0 ** exponent)
+            exponent = 0.0
+        row = self._rows.setdefault(previous[0], {})
+        row[song_id] = row.get(song_id, 0.0) + 2.0 ** exponent
+        self._predecessors.setdefault(song_id, set()).add(previous[0])
+        if len(row) > self.max_successors:
+            weakest = min(row, key=row.get)
+            del row[weakest]
+            self._predecessors[weakest].discard(previous[0])
+
+    def _forget(self, song_id: str):
+        for next_id in self._rows.pop(song_id, {}):
+            self._predecessors[next_id].discard(song_id)
+        for previous_id in self._predecessors.pop(song_id, ()):
+            self._rows[previous_id].pop(song_id, None)
+        if self._last is not None and self._last[0] == song_id:
+            self._last = None
+
+    def _rescale(self, factor: float):
+        for row in self._rows.values():
+            for next_id in row:
+                row[next_id] /= factor
+        self._offset = self._events
+
+    def _snapshot(self) -> dict:
+        self._ensure_loaded()
+        return {
+            'rows': {song_id: dict(row) for song_id, row in self._rows.items()},
+            'events': self._events,
+            'offset': self._offset,
+            'last': list(self._last) if self._last else None,
+        }
@@ -0,0 +1,86 @@
+"""
+Playback Clock
+One authoritative playback position, shared by the progress slider, the
+lyrics and the visualizer. It follows what the mixer has actually played
+rather than wall-clock deltas.
+"""
+
+import threading
+import time
+
+MAX_LEAD = 0.2  # Detik maksimal interpolasi boleh mendahului posisi terakhir dari mixer
+
+
+class PlaybackClock:
+    """
+    Position in seconds within the current track.
+
+    The mixer (pygame.mixer.music.get_pos) counts the audio it has really
+    output since the last play(), so it does not drift and does not count
+    paused time. But it does not know the seek offset passed to play(start=...),
+    and it only advances once per audio buffer. The clock adds the offset and
+    interpolates between buffer steps with time.monotonic() (immune to system
+    clock changes), never more than MAX_LEAD past the mixer and never going
+    backwards between reads. When the mixer reports nothing (-1, e.g. the
+    track just ended) it keeps counting on the monotonic clock alone.
+
+    Call start() right after play()/play(start=offset) or when a queued track
+    begins, and pause()/resume() together with the mixer.
+    """
+
+    def __init__(self, mixer_position=None, monotonic=time.monotonic):
+        self._mixer_position = mixer_position  # Callable -> milidetik sejak play(), atau -1
+        self._monotonic = monotonic
+        self._lock = threading.Lock()  # Dibaca dari thread GUI dan thread visualizer
+        self._running = False
+        self._offset = 0.0  # Posisi (detik) saat play() terakhir
+        self._frozen = 0.0  # Posisi saat dijeda/berhenti
+        self._anchor_ms = None  # Nilai get_pos terakhir yang berubah ...
+        self._anchor_time = 0.0  # ... dan kapan perubahan itu terlihat
+        self._last = 0.0  # Posisi terakhir yang dikembalikan
+        self._last_time = 0.0
+
+    def start(self, offset: float = 0.0):
+        """The mixer (re)started playing at `offset` seconds into the track."""
+        with self._lock:
+            self._running = True
+            self._offset = offset
+            self._anchor_ms = None
+            self._last = offset
+            self._last_time = self._monotonic()
+
+    def pause(self):
+        with self._lock:
+            self._frozen = self._read()
+            self._running = False
+
+    def resume(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            # get_pos melanjutkan dari titik jeda, jadi offset tetap; hanya acuan interpolasi yang direset
+            self._anchor_ms = None
+            self._last = self._frozen
+            self._last_time = self._monotonic()
+
+    def position(self) -> float:
+        with self._lock:
+            return self._read()
+
+    def _read(self) -> float:
+        if not self._running:
+            return self._frozen
+        now = self._monotonic()
+        mixer_ms = self._mixer_position() if self._mixer_position is not None else -1
+        if mixer_ms is None or mixer_ms < 0:
+            position = self._last + (now - self._last_time)
+        else:
+            if mixer_ms != self._anchor_ms:
+                self._anchor_ms = mixer_ms
+                self._anchor_time = now
+            position = self._offset + mixer_ms / 1000.0 + min(now - self._anchor_time, MAX_LEAD)
+        position = max(position, self._last)
+        self._last = position
+        self._last_time = now
+        return position
@@ -0,0 +1,54 @@
+"""
+Query Result Cache
+Bounded LRU cache for read-only library queries (search, genre filter).
+Entries are keyed by the query plus the library generation at the time they
+were computed, so a mutation that bumps the generation makes every older
+entry unreachable without walking the cache.
+"""
+
+from collections import OrderedDict
+
+DEFAULT_CAPACITY = 256
+
+
+class QueryCache:
+    """LRU map of (kind, query, generation) -> result tuple, with hit/miss counters."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Cached result for `key`, or None (counted as a miss)."""
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key, result: tuple):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        # Entri generasi lama tidak pernah diminta lagi, jadi ikut tergusur sebagai yang terlama
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'capacity': self.capacity,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,206 @@
+"""
+Structured Library Queries
+Parser and planner for queries such as `artist:adele genre:pop duration:<240`.
+Every predicate is answered from an index of the player; the planner drives
+from the most selective predicate and checks the others per candidate, so a
+query never scans the library. Genre and duration checks over a large
+candidate list run as masks over the player's SongTable when it has one.
+
+Syntax (terms are ANDed):
+    artist:<words>   title:<words>   album:<words>   every word is a word prefix in that field
+    genre:<name>                                        exact genre, case-insensitive
+    duration:<240  duration:>=3:30  duration:180..240   seconds or m:ss, ranges inclusive
+    anything else                                       free words, each a word prefix in any field
+Values with spaces can be quoted: artist:"bruno mars".
+"""
+
+import re
+
+from search_index import tokenize, field_key
+
+TEXT_FIELDS = ('artist', 'title', 'album')
+COLUMN_FILTER_MIN = 256  # Mulai jumlah kandidat ini, predikat genre/durasi dicek lewat SongTable
+
+_TERM_RE = re.compile(r'(\w+):(?:"([^"]*)"|(\S+))|"([^"]*)"|(\S+)')
+_COMPARISON_RE = re.compile(r'^(<=|>=|<|>|=)?(.+)$')
+
+
+class QuerySyntaxError(ValueError):
+    """Raised for a recognised field whose value cannot be parsed (e.g. `duration:<abc`)."""
+
+
+def is_structured(query: str) -> bool:
+    """True if `query` uses at least one known `field:` predicate."""
+    return any(match.group(1) and match.group(1).lower() in FIELD_PARSERS
+               for match in _TERM_RE.finditer(query or ""))
+
+
+def parse_duration(text: str) -> int:
+    """'240' -> 240, '4:00' -> 240."""
+    try:
+        if ":" in text:
+            minutes, seconds = text.split(":", 1)
+            return int(minutes) * 60 + int(seconds)
+        return int(text)
+    except ValueError:
+        raise QuerySyntaxError(f"Durasi tidak valid: '{text}'") from None
+
+
+# --- Predikat ---
+class TextFieldPredicate:
+    """Every word of `value` is a prefix of some word in song.<field>."""
+
+    def __init__(self, field: str, value: str):
+        self.field = field
+        self.value = value
+        self.tokens = tokenize(value)
+
+    def estimate(self, player) -> int:
+        return player.search_index.estimate(self.value)
+
+    def candidates(self, player) -> list:
+        # Superset dari index kata (semua field), lalu disaring ke field ini
+        library = player.song_library
+        return [library[song_id] for song_id in player.search_index.match_set(self.value)
+                if self.matches(library[song_id], player)]
+
+    def matches(self, song, player) -> bool:
+        words = tokenize(getattr(song, self.field))
+        return all(any(word.startswith(token) for word in words) for token in self.tokens)
+
+
+class GenrePredicate:
+    def __init__(self, value: str):
+        self.value = value
+        self.key = field_key(value)
+
+    def estimate(self, player) -> int:
+        return player.genre_index.count(self.value)
+
+    def candidates(self, player) -> list:
+        return list(player.genre_index.songs(self.value))
+
+    def matches(self, song, player) -> bool:
+        return field_key(song.genre) == self.key
+
+    def column_mask(self, table, rows):
+        return table.genre_mask(rows, self.value)
+
+
+class DurationPredicate:
+    def __init__(self, low=None, high=None, include_low=True, include_high=True):
+        self.bounds = (low, high, include_low, include_high)
+
+    def estimate(self, player) -> int:
+        return player.duration_index.count(*self.bounds)
+
+    def candidates(self, player) -> list:
+        library = player.song_library
+        return [library[song_id] for song_id in player.duration_index.range(*self.bounds)]
+
+    def matches(self, song, player) -> bool:
+        low, high, include_low, include_high = self.bounds
+        duration = song.duration_seconds or 0
+        if low is not None and (duration < low or (duration == low and not include_low)):
+            return False
+        if high is not None and (duration > high or (duration == high and not include_high)):
+            return False
+        return True
+
+    def column_mask(self, table, rows):
+        return table.duration_mask(rows, *self.bounds)
+
+
+class FreeTextPredicate:
+    """
+    Plain words, each a word prefix in any field. No typo matching here, so the
+    answer is the same whether this predicate drives the plan or filters it.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def estimate(self, player) -> int:
+        return player.search_index.estimate(self.text)
+
+    def candidates(self, player) -> list:
+        library = player.song_library
+        return [library[song_id] for song_id in player.search_index.match_set(self.text)]
+
+    def matches(self, song, player) -> bool:
+        return player.search_index.matches(song.song_id, self.text)
+
+
+# --- Parser ---
+def _parse_duration_predicate(value: str) -> DurationPredicate:
+    if ".." in value:
+        low, high = value.split("..", 1)
+        return DurationPredicate(parse_duration(low) if low else None,
+                                 parse_duration(high) if high else None)
+    op, number = _COMPARISON_RE.match(value).groups()
+    seconds = parse_duration(number)
+    if op == "<":
+        return DurationPredicate(high=seconds, include_high=False)
+    if op == "<=":
+        return DurationPredicate(high=seconds)
+    if op == ">":
+        return DurationPredicate(low=seconds, include_low=False)
+    if op == ">=":
+        return DurationPredicate(low=seconds)
+    return DurationPredicate(seconds, seconds)
+
+
+FIELD_PARSERS = {
+    'genre': GenrePredicate,
+    'duration': _parse_duration_predicate,
+}
+for _field in TEXT_FIELDS:
+    FIELD_PARSERS[_field] = lambda value, field=_field: TextFieldPredicate(field, value)
+
+
+def parse_query(query: str) -> list:
+    """Turn a query string into a list of predicates (free words are merged into one)."""
+    predicates = []
+    free_words = []
+    for match in _TERM_RE.finditer(query or ""):
+        field, quoted_value, value, quoted_text, word = match.groups()
+        if field and field.lower() in FIELD_PARSERS:
+            value = quoted_value if quoted_value is not None else value
+            if value.strip():
+                predicates.append(FIELD_PARSERS[field.lower()](value))
+        else:
+            free_words.append(match.group(0) if field else (quoted_text or word))
+    if free_words:
+        predicates.append(FreeTextPredicate(" ".join(free_words)))
+    return predicates
+
+
+# --- Planner ---
+def execute(predicates: list, player) -> list:
+    """
+    Songs matching every predicate, in library order. Estimates are index
+    counts (an upper bound for word predicates); the smallest predicate
+    produces the candidates and the rest filter them, most selective first.
+    No predicates, no results.
+
+    Predicates implement estimate(player), candidates(player) and
+    matches(song, player); those with column_mask(table, rows) are checked
+    together on player.song_table when there are many candidates.
+    """
+    if not predicates:
+        return []
+    ordered = sorted(predicates, key=lambda predicate: predicate.estimate(player))
+    songs = ordered[0].candidates(player)
+    rest = ordered[1:]
+    table = getattr(player, 'song_table', None)
+    if table is not None and len(songs) >= COLUMN_FILTER_MIN:
+        columnar = [predicate for predicate in rest if hasattr(predicate, 'column_mask')]
+        if columnar:
+            songs = table.filter(songs, columnar)
+            rest = [predicate for predicate in rest if not hasattr(predicate, 'column_mask')]
+    for predicate in rest:
+        if not songs:
+            break
+        songs = [song for song in songs if predicate.matches(song, player)]
+    songs.sort(key=lambda song: player.search_index.order_of(song.song_id))
+    return songs
@@ -0,0 +1,548 @@
+"""
+Inverted Search Index
+Token -> song-id postings over the library so a search intersects a few small
+sets instead of substring-scanning every song's metadata, plus a trigram index
+over the token vocabulary for typo-tolerant, ranked matching, exact-value
+secondary indexes for genre/artist lookups and a sorted range index.
+"""
+
+import heapq
+import random
+import re
+import unicodedata
+from bisect import bisect_left, insort
+
+_TOKEN_RE = re.compile(r"\w+")
+
+EXACT_SCORE = 1.0  # Token query sama persis dengan token lagu
+PREFIX_SCORE = 0.9  # Token query adalah awalan token lagu (skor penuh saat panjangnya sama)
+FUZZY_WEIGHT = 0.8  # Pengali kemiripan trigram untuk kecocokan salah ketik
+FUZZY_THRESHOLD = 0.45  # Kemiripan Dice minimum agar sebuah token dianggap salah ketik
+FUZZY_MIN_LENGTH = 3  # Token query yang lebih pendek tidak dicari secara fuzzy
+EDIT_DISTANCE_MAX_LENGTH = 8  # Token pendek juga dicek jarak edit (trigramnya terlalu sedikit)
+SEARCH_FIELDS = ('title', 'artist', 'album', 'genre')
+
+
+def normalize(text) -> str:
+    """Casefold `text` and strip diacritics ("Beyoncé" -> "beyonce")."""
+    if not text:
+        return ""
+    if text.isascii():
+        # Tanpa diakritik yang perlu dibuang; lower() setara casefold() untuk ASCII
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text) -> list:
+    """Normalised word tokens of `text` (empty list for None/empty)."""
+    if not text:
+        return []
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def trigrams(token: str) -> set:
+    """Trigrams of `token` padded with '$' at both ends, so short tokens still get some."""
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """True if `a` and `b` differ by at most one insert, delete, substitution or adjacent swap."""
+    if len(a) > len(b):
+        a, b = b, a
+    # Lewati awalan yang sama
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return (a[i + 1:] == b[i + 1:]  # substitusi
+                or (i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i]
+                    and a[i + 2:] == b[i + 2:]))  # tukar
+    return a[i:] == b[i + 1:]  # sisip / hapus
+
+
+class SearchIndex:
+    """
+    Inverted index of normalised tokens from ID, title, artist, album and genre.
+
+    A query is split into tokens and every token must match (AND). A token
+    matches exactly, as a prefix ("bru mar" finds "Bruno Mars") or, only when
+    it does neither, through the trigram index over the vocabulary as a likely
+    typo ("bruni" finds "bruno"). Each song is scored by its best match per query token and
+    results are ranked by score, ties in the order songs were first indexed.
+
+    Postings are sets of song IDs; a sorted vocabulary list turns a prefix into
+    a bisect range. The vocabulary is sorted on the first query and the trigram
+    index built on the first fuzzy query, so bulk loading stays linear. Each field is normalised once per song and kept, so
+    other indexes (autocomplete, sort keys) read it instead of normalising again.
+    """
+
+    def __init__(self):
+        self._postings = {}  # token -> set(song_id)
+        self._vocabulary = None  # Token terurut untuk prefix via bisect (None = belum dibangun)
+        self._trigram_tokens = None  # trigram -> set(token) dari kosakata (None = belum dibangun)
+        self._tokens_of = {}  # song_id -> frozenset token (untuk update/hapus)
+        self._fields_of = {}  # song_id -> tuple field ternormalisasi, urut SEARCH_FIELDS
+        self._shared_values = {}  # Artis/album/genre ternormalisasi: satu objek string per nilai
+        self._order = {}  # song_id -> nomor urut saat pertama diindeks
+        self._next_order = 0
+
+    def __len__(self):
+        return len(self._tokens_of)
+
+    # --- Mutasi ---
+    def add(self, song, order: int = None):
+        if song.song_id in self._tokens_of:
+            self.update(song)
+            return
+        if order is None:
+            order = self._next_order
+            self._next_order += 1
+        self._order[song.song_id] = order
+        fields = self._fields_of[song.song_id] = self._normalize_fields(song)
+        self._index(song.song_id, self._song_tokens(song.song_id, fields))
+
+    def update(self, song):
+        old_tokens = self._tokens_of.get(song.song_id)
+        if old_tokens is None:
+            self.add(song)
+            return
+        fields = self._fields_of[song.song_id] = self._normalize_fields(song)
+        new_tokens = self._song_tokens(song.song_id, fields)
+        if new_tokens == old_tokens:
+            return
+        # Hanya token yang berubah yang disentuh
+        for token in old_tokens - new_tokens:
+            self._unpost(token, song.song_id)
+        for token in new_tokens - old_tokens:
+            self._post(token, song.song_id)
+        self._tokens_of[song.song_id] = new_tokens
+
+    def remove(self, song_id: str):
+        tokens = self._tokens_of.pop(song_id, None)
+        if tokens is None:
+            return
+        self._order.pop(song_id, None)
+        self._fields_of.pop(song_id, None)
+        for token in tokens:
+            self._unpost(token, song_id)
+
+    # --- Query ---
+    def search(self, query: str, limit: int = None, fuzzy: bool = True) -> list:
+        """
+        IDs of songs matching every token of `query`, best match first.
+        `limit` keeps only the top results; `fuzzy=False` disables typo matching.
+        """
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+
+        # Per token query: daftar (skor, posting) terurut dari skor tertinggi
+        scored_postings = []
+        for token in tokens:
+            matches = self._token_matches(token, fuzzy)
+            if not matches:
+                return []
+            scored_postings.append(matches)
+
+        # Kandidat = irisan gabungan posting per token, mulai dari yang terkecil
+        unions = sorted((self._union(matches) for matches in scored_postings), key=len)
+        candidates = set(unions[0])
+        for matches in unions[1:]:
+            candidates.intersection_update(matches)
+            if not candidates:
+                return []
+
+        # Skor per lagu = jumlah skor kecocokan terbaik tiap token query. Token dengan satu
+        # kecocokan menambah skor yang sama ke semua kandidat, jadi tidak perlu dihitung.
+        scores = {}
+        for matches in scored_postings:
+            if len(matches) == 1:
+                continue
+            remaining = set(candidates)
+            for score, postings in matches:
+                hits = remaining & postings
+                if not hits:
+                    continue
+                remaining -= hits
+                for song_id in hits:
+                    scores[song_id] = scores.get(song_id, 0.0) + score
+                if not remaining:
+                    break
+
+        order = self._order
+        if scores:
+            rank = lambda song_id: (-scores.get(song_id, 0.0), order[song_id])
+        else:
+            rank = order.__getitem__
+        if limit is not None and limit < len(candidates):
+            return heapq.nsmallest(limit, candidates, key=rank)
+        return sorted(candidates, key=rank)
+
+    def match_set(self, query: str) -> set:
+        """Unranked IDs of songs where every token of `query` is a word prefix (no fuzzy matching)."""
+        tokens = set(tokenize(query))
+        if not tokens:
+            return set()
+        unions = sorted((self._union([(EXACT_SCORE, self._postings[token])
+                                      for token in self.tokens_with_prefix(query_token)])
+                         for query_token in tokens), key=len)
+        result = set(unions[0])
+        for matches in unions[1:]:
+            result.intersection_update(matches)
+        return result
+
+    def normalized(self, song_id: str, field: str) -> str:
+        """The song's `field` (one of SEARCH_FIELDS) as normalised when it was indexed."""
+        return self._fields_of[song_id][SEARCH_FIELDS.index(field)]
+
+    def order_of(self, song_id: str) -> int:
+        """Position of a song in index (first-added) order, for stable sorting."""
+        return self._order[song_id]
+
+    def estimate(self, query: str) -> int:
+        """
+        Cheap upper bound on the number of exact/prefix matches for `query`: the
+        smallest total posting size among its tokens (no sets are built).
+        """
+        tokens = set(tokenize(query))
+        if not tokens:
+            return 0
+        return min(sum(len(self._postings[token]) for token in self.tokens_with_prefix(query_token))
+                   for query_token in tokens)
+
+    def matches(self, song_id: str, query: str) -> bool:
+        """True if every token of `query` is a prefix of some token of the song (no fuzzy matching)."""
+        song_tokens = self._tokens_of.get(song_id)
+        if song_tokens is None:
+            return False
+        return all(any(token.startswith(query_token) for token in song_tokens)
+                   for query_token in tokenize(query))
+
+    def tokens_with_prefix(self, prefix: str) -> list:
+        """Indexed tokens starting with `prefix`, in sorted order."""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        start = bisect_left(self._vocabulary, prefix)
+        end = bisect_left(self._vocabulary, prefix + "\U0010ffff", start)
+        return self._vocabulary[start:end]
+
+    # --- Helper internal ---
+    def _normalize_fields(self, song) -> tuple:
+        shared = self._shared_values
+        title = normalize(song.title)
+        artist = normalize(song.artist)
+        album = normalize(song.album)
+        genre = normalize(song.genre)
+        return (title, shared.setdefault(artist, artist), shared.setdefault(album, album),
+                shared.setdefault(genre, genre))
+
+    @staticmethod
+    def _song_tokens(song_id: str, fields: tuple) -> frozenset:
+        tokens = set(tokenize(song_id))
+        for value in fields:
+            tokens.update(_TOKEN_RE.findall(value))
+        return frozenset(tokens)
+
+    def _index(self, song_id: str, tokens: frozenset):
+        self._tokens_of[song_id] = tokens
+        for token in tokens:
+            self._post(token, song_id)
+
+    def _post(self, token: str, song_id: str):
+        postings = self._postings.get(token)
+        if postings is None:
+            postings = self._postings[token] = set()
+            if self._vocabulary is not None:
+                insort(self._vocabulary, token)
+            if self._trigram_tokens is not None:
+                for gram in trigrams(token):
+                    self._trigram_tokens.setdefault(gram, set()).add(token)
+        postings.add(song_id)
+
+    def _unpost(self, token: str, song_id: str):
+        postings = self._postings.get(token)
+        if postings is None:
+            return
+        postings.discard(song_id)
+        if not postings:
+            del self._postings[token]
+            if self._trigram_tokens is not None:
+                for gram in trigrams(token):
+                    tokens = self._trigram_tokens.get(gram)
+                    if tokens is not None:
+                        tokens.discard(token)
+                        if not tokens:
+                            del self._trigram_tokens[gram]
+            if self._vocabulary is None:
+                return
+            pos = bisect_left(self._vocabulary, token)
+            if pos < len(self._vocabulary) and self._vocabulary[pos] == token:
+                del self._vocabulary[pos]
+
+    def _token_matches(self, query_token: str, fuzzy: bool) -> list:
+        """[(score, postings), ...] for every vocabulary token `query_token` matches, best first."""
+        best = {}
+        for token in self.tokens_with_prefix(query_token):
+            if token == query_token:
+                best[token] = EXACT_SCORE
+            else:
+                best[token] = PREFIX_SCORE * len(query_token) / len(token)
+        # Fuzzy hanya jika token tidak cocok persis/prefix sama sekali, agar "kalomi rate" tidak
+        # melebar ke semua kata mirip "rate". Angka (ID, tahun, nomor track) tidak dicari secara
+        # fuzzy: "2019" bukan salah ketik "2018".
+        if not best and fuzzy and len(query_token) >= FUZZY_MIN_LENGTH and not query_token.isdigit():
+            for token, similarity in self._similar_tokens(query_token):
+                best[token] = FUZZY_WEIGHT * similarity
+        matches = [(score, self._postings[token]) for token, score in best.items()]
+        matches.sort(key=lambda match: match[0], reverse=True)
+        return matches
+
+    def _similar_tokens(self, query_token: str) -> list:
+        """
+        Vocabulary tokens similar to `query_token`: trigram Dice similarity, or for
+        short tokens one edit (insert, delete, substitute, swap) away.
+        """
+        if self._trigram_tokens is None:
+            self._trigram_tokens = {}
+            for token in self._postings:
+                for gram in trigrams(token):
+                    self._trigram_tokens.setdefault(gram, set()).add(token)
+        query_grams = trigrams(query_token)
+        shared = {}
+        for gram in query_grams:
+            for token in self._trigram_tokens.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        # Dice = 2|A∩B| / (|A|+|B|); token berpanjangan n punya n trigram (dengan padding '$')
+        short_query = len(query_token) <= EDIT_DISTANCE_MAX_LENGTH
+        similar = []
+        for token, common in shared.items():
+            similarity = 2.0 * common / (len(query_grams) + len(token))
+            if (similarity < FUZZY_THRESHOLD and short_query
+                    and abs(len(token) - len(query_token)) <= 1
+                    and _within_one_edit(query_token, token)):
+                similarity = 1.0 - 1.0 / max(len(token), len(query_token))
+            if similarity >= FUZZY_THRESHOLD:
+                similar.append((token, similarity))
+        return similar
+
+    @staticmethod
+    def _union(matches: list) -> set:
+        # Satu token cocok: pakai set-nya langsung tanpa union
+        if not matches:
+            return set()
+        if len(matches) == 1:
+            return matches[0][1]
+        union = set()
+        for _, postings in matches:
+            union |= postings
+        return union
+
+
+def field_key(value) -> str:
+    """Case-normalised key for exact-value indexes ("  R&B " and "r&b" share one)."""
+    return (value or "").strip().casefold()
+
+
+class FieldIndex:
+    """
+    Secondary index of one Song attribute (genre, artist): normalised value -> songs.
+
+    Buckets keep songs in insertion order with O(1) add/remove; the sequence
+    used for listing and random picks is materialised lazily per bucket and
+    reused until that bucket changes. The first spelling seen for a value is
+    kept as its display label.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self._buckets = {}  # key -> {song_id: Song}
+        self._labels = {}  # key -> label tampilan (ejaan pertama yang dipakai)
+        self._key_of = {}  # song_id -> key saat ini
+        self._sequences = {}  # key -> tuple Song (cache, dibuang saat bucket berubah)
+
+    def __len__(self):
+        return len(self._buckets)
+
+    # --- Mutasi ---
+    def add(self, song):
+        if song.song_id in self._key_of:
+            self.update(song)
+            return
+        value = getattr(song, self.field)
+        key = field_key(value)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = {}
+            self._labels[key] = (value or "").strip()
+        bucket[song.song_id] = song
+        self._key_of[song.song_id] = key
+        self._sequences.pop(key, None)
+
+    def update(self, song):
+        old_key = self._key_of.get(song.song_id)
+        if old_key is not None and old_key == field_key(getattr(song, self.field)):
+            return
+        self.remove(song.song_id)
+        self.add(song)
+
+    def remove(self, song_id: str):
+        key = self._key_of.pop(song_id, None)
+        if key is None:
+            return
+        bucket = self._buckets[key]
+        del bucket[song_id]
+        self._sequences.pop(key, None)
+        if not bucket:
+            del self._buckets[key]
+            del self._labels[key]
+
+    # --- Query ---
+    def songs(self, value) -> tuple:
+        """Songs whose attribute equals `value` (case-insensitive), in insertion order."""
+        key = field_key(value)
+        sequence = self._sequences.get(key)
+        if sequence is None:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                return ()
+            sequence = self._sequences[key] = tuple(bucket.values())
+        return sequence
+
+    def count(self, value) -> int:
+        return len(self._buckets.get(field_key(value), ()))
+
+    def random_song(self, value, exclude=None):
+        """A random song with this value other than `exclude`, or None. O(1) once the bucket is cached."""
+        sequence = self.songs(value)
+        if exclude is None or self._key_of.get(exclude.song_id) != field_key(value):
+            return random.choice(sequence) if sequence else None
+        if len(sequence) < 2:
+            return None
+        # `exclude` ada tepat sekali di bucket: pilih dari n-1 posisi, posisinya diganti elemen terakhir
+        pick = sequence[random.randrange(len(sequence) - 1)]
+        return sequence[-1] if pick is exclude else pick
+
+    def values(self) -> list:
+        """(label, song count) for every value, largest first, ties alphabetical."""
+        return sorted(((self._labels[key], len(bucket)) for key, bucket in self._buckets.items()),
+                      key=lambda item: (-item[1], item[0].casefold()))
+
+
+class RangeIndex:
+    """
+    Sorted index of one Song attribute: duration for range predicates, and the
+    collation keys (via `key`, a callable song -> sort value) that sorted views
+    page through.
+
+    Entries are (sort value, seq, song_id) tuples in a sorted list, so a range
+    is two bisects, a count is free and a page is a slice; seq keeps ties in
+    the order songs were added. Like the token vocabulary, nothing is computed
+    while songs are bulk-added: sort values are read and the list is sorted on
+    the first query, then maintained with insort/delete.
+    """
+
+    def __init__(self, field: str, key=None):
+        self.field = field
+        self.key = key
+        self._entry_of = {}  # song_id -> (nilai sort, seq, song_id)
+        self._pending = {}  # song_id -> (Song, seq) yang nilai sort-nya belum dihitung
+        self._sorted = None  # Entri terurut (None = belum dibangun)
+        self._next_seq = 0
+
+    def __len__(self):
+        return len(self._entry_of) + len(self._pending)
+
+    # --- Mutasi ---
+    def add(self, song, seq: int = None):
+        if song.song_id in self._entry_of or song.song_id in self._pending:
+            self.update(song)
+            return
+        if seq is None:
+            seq = self._next_seq
+            self._next_seq += 1
+        if self._sorted is None:
+            self._pending[song.song_id] = (song, seq)
+            return
+        entry = (self._value(song), seq, song.song_id)
+        self._entry_of[song.song_id] = entry
+        insort(self._sorted, entry)
+
+    def update(self, song):
+        if song.song_id in self._pending:
+            return  # Nilai sort dibaca saat query pertama, jadi otomatis yang terbaru
+        entry = self._entry_of.get(song.song_id)
+        if entry is None:
+            self.add(song)
+            return
+        if entry[0] == self._value(song):
+            return
+        self.remove(song.song_id)
+        self.add(song, seq=entry[1])
+
+    def remove(self, song_id: str):
+        if self._pending.pop(song_id, None) is not None:
+            return
+        entry = self._entry_of.pop(song_id, None)
+        if entry is None or self._sorted is None:
+            return
+        pos = bisect_left(self._sorted, entry)
+        if pos < len(self._sorted) and self._sorted[pos] == entry:
+            del self._sorted[pos]
+
+    def seq_of(self, song_id: str):
+        """The tie-break number the song was added with (pass it back to add() to restore its place)."""
+        pending = self._pending.get(song_id)
+        if pending is not None:
+            return pending[1]
+        entry = self._entry_of.get(song_id)
+        return entry[1] if entry is not None else None
+
+    # --- Query ---
+    def range(self, low=None, high=None, include_low=True, include_high=True) -> list:
+        """IDs with low <= value <= high (bounds optional, exclusive if asked), ascending by value."""
+        start, end = self._bounds(low, high, include_low, include_high)
+        return [entry[2] for entry in self._sorted[start:end]]
+
+    def count(self, low=None, high=None, include_low=True, include_high=True) -> int:
+        start, end = self._bounds(low, high, include_low, include_high)
+        return max(0, end - start)
+
+    def page(self, offset: int, limit: int = None, descending: bool = False) -> list:
+        """IDs at positions offset..offset+limit of the sorted order (or of its reverse)."""
+        self._ensure_sorted()
+        size = len(self._sorted)
+        end = size if limit is None else min(size, offset + limit)
+        if descending:
+            entries = self._sorted[size - end:size - offset][::-1] if offset < size else []
+        else:
+            entries = self._sorted[offset:end]
+        return [entry[2] for entry in entries]
+
+    def sort_key(self, song_id: str):
+        """Precomputed (sort value, seq) of a song, for sorting subsets without recomputing keys."""
+        self._ensure_sorted()
+        return self._entry_of[song_id][:2]
+
+    # --- Helper internal ---
+    def _value(self, song):
+        if self.key is not None:
+            return self.key(song)
+        return getattr(song, self.field) or 0
+
+    def _ensure_sorted(self):
+        if self._sorted is not None:
+            return
+        for song_id, (song, seq) in self._pending.items():
+            self._entry_of[song_id] = (self._value(song), seq, song_id)
+        self._pending = {}
+        self._sorted = sorted(self._entry_of.values())
+
+    def _bounds(self, low, high, include_low, include_high):
+        self._ensure_sorted()
+        entries = self._sorted
+        # (v,) < (v, seq, id) < (v, inf): cukup bisect_left dengan tuple pembatas
+        start = 0 if low is None else bisect_left(entries, (low,) if include_low else (low, float('inf')))
+        end = len(entries) if high is None else bisect_left(entries, (high, float('inf')) if include_high else (high,))
+        return start, end
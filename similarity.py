@@ -0,0 +1,297 @@
+"""
+Song Similarity Engine
+Feature vectors for every song in one NumPy store, and top-k neighbours by
+cosine similarity in a single vectorised pass. Used to pick the next track
+in library mode.
+"""
+
+import zlib
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+from search_index import field_key
+
+DURATION_BUCKETS = 8  # Ember durasi per 60 detik; ember terakhir menampung semua yang lebih panjang
+COOC_DIM = 32  # Dimensi vektor konteks co-occurrence (random indexing)
+COOC_NONZERO = 4  # Jumlah elemen ±1 pada vektor indeks acak tiap lagu
+AUDIO_FEATURE_DIM = 8  # Panjang vektor fitur audio (nol jika belum dianalisis)
+
+# Bobot tiap blok fitur (kuadratnya menjadi kontribusi ke dot product)
+ARTIST_WEIGHT = 1.0
+GENRE_WEIGHT = 0.8
+DURATION_WEIGHT = 0.4
+COOC_WEIGHT = 1.0
+AUDIO_WEIGHT = 0.6
+
+_DURATION_SLICE = slice(0, DURATION_BUCKETS)
+_COOC_SLICE = slice(DURATION_BUCKETS, DURATION_BUCKETS + COOC_DIM)
+_AUDIO_SLICE = slice(DURATION_BUCKETS + COOC_DIM, DURATION_BUCKETS + COOC_DIM + AUDIO_FEATURE_DIM)
+DENSE_DIM = DURATION_BUCKETS + COOC_DIM + AUDIO_FEATURE_DIM
+
+
+class SimilarityEngine:
+    """
+    Cosine similarity over per-song feature vectors.
+
+    A song's vector is [one-hot artist | one-hot genre | one-hot duration
+    bucket | co-occurrence context | audio features], each block scaled by its
+    weight. The artist and genre one-hots are stored as integer codes (a dense
+    one-hot over thousands of artists would not fit in memory), and their dot
+    product is an equality test on the code columns. Everything else lives in
+    one float32 matrix. A query is one matrix-vector product plus two
+    comparisons over all rows, then argpartition for the top k.
+
+    Co-occurrence uses random indexing: every song has a fixed sparse random
+    ±1 index vector, and playing B after A adds B's index vector to A's
+    context (and vice versa), so songs heard in the same sessions point the
+    same way. Rows of deleted songs are tombstoned and reused. Stored
+    transitions can be handed over with `defer_transitions`, so they are only
+    read when the first score is computed.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._capacity = capacity
+        self._size = 0  # Batas atas baris yang pernah dipakai
+        self._row_of = {}  # song_id -> baris
+        self._ids = []  # baris -> song_id (None jika kosong)
+        self._free_rows = []
+
+        self._artist = np.full(capacity, -1, dtype=np.int32)
+        self._genre = np.full(capacity, -1, dtype=np.int32)
+        self._dense = np.zeros((capacity, DENSE_DIM), dtype=np.float32)
+        self._context = np.zeros((capacity, COOC_DIM), dtype=np.float32)  # Vektor konteks mentah
+        self._norms = np.ones(capacity, dtype=np.float32)
+        self._alive = np.zeros(capacity, dtype=bool)
+
+        self._artist_codes = {}
+        self._genre_codes = {}
+        self._deferred_transitions = None  # Callable yang dijalankan sebelum skor pertama
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def __contains__(self, song_id):
+        return song_id in self._row_of
+
+    # --- Mutasi ---
+    def add(self, song):
+        if song.song_id in self._row_of:
+            self.update(song)
+            return
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            if self._size == self._capacity:
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._ids.append(None)
+        self._row_of[song.song_id] = row
+        self._ids[row] = song.song_id
+        self._alive[row] = True
+        self._context[row] = 0.0
+        self._dense[row] = 0.0
+        self._write_metadata(row, song)
+
+    def update(self, song):
+        row = self._row_of.get(song.song_id)
+        if row is None:
+            self.add(song)
+            return
+        self._write_metadata(row, song)
+
+    def remove(self, song_id: str):
+        row = self._row_of.pop(song_id, None)
+        if row is None:
+            return
+        self._ids[row] = None
+        self._alive[row] = False
+        self._free_rows.append(row)
+
+    def record_transition(self, from_id: str, to_id: str, weight: float = 1.0):
+        """Two songs were played back to back: pull their co-occurrence contexts together."""
+        self.record_transitions([(from_id, to_id, weight)])
+
+    def record_transitions(self, transitions):
+        """Fold many (from_id, to_id, weight) transitions in at once, e.g. the saved play history."""
+        index_vectors = {}
+        touched = set()
+        for from_id, to_id, weight in transitions:
+            from_row = self._row_of.get(from_id)
+            to_row = self._row_of.get(to_id)
+            if from_row is None or to_row is None or from_row == to_row:
+                continue
+            for song_id in (from_id, to_id):
+                if song_id not in index_vectors:
+                    index_vectors[song_id] = self._index_vector(song_id)
+            self._context[from_row] += weight * index_vectors[to_id]
+            self._context[to_row] += weight * index_vectors[from_id]
+            touched.update((from_row, to_row))
+        for row in touched:
+            self._refresh_context(row)
+
+    def defer_transitions(self, source):
+        """record_transitions(source()) just before the first score is computed, not now."""
+        self._deferred_transitions = source
+
+    @property
+    def transitions_pending(self) -> bool:
+        """True while deferred transitions have not been folded in yet."""
+        return self._deferred_transitions is not None
+
+    def set_audio_features(self, song_id: str, features):
+        """Attach an audio feature vector (length AUDIO_FEATURE_DIM) to a song; None clears it."""
+        row = self._row_of.get(song_id)
+        if row is None:
+            return
+        block = np.zeros(AUDIO_FEATURE_DIM, dtype=np.float32)
+        if features is not None:
+            vector = np.asarray(features, dtype=np.float32)[:AUDIO_FEATURE_DIM]
+            norm = float(np.linalg.norm(vector))
+            if norm > 0:
+                block[:len(vector)] = AUDIO_WEIGHT * vector / norm
+        self._dense[row, _AUDIO_SLICE] = block
+        self._refresh_norm(row)
+
+    # --- Query ---
+    def query(self, song_ids) -> "ScoreQuery":
+        """Capture what scoring `song_ids` needs (cheap); the ScoreQuery can then run without any lock."""
+        if self._deferred_transitions is not None:
+            source, self._deferred_transitions = self._deferred_transitions, None
+            self.record_transitions(source())
+        return ScoreQuery(self, song_ids)
+
+    def top_k(self, song_id: str, k: int = 10, exclude=(), min_score: float = 0.0) -> list:
+        """
+        [(song_id, cosine score), ...] of the k most similar songs, best first.
+        The song itself, IDs in `exclude` and scores <= min_score are left out.
+        """
+        excluded_rows = [self._row_of[excluded_id] for excluded_id in exclude if excluded_id in self._row_of]
+        return self.query([song_id]).top_k(k, min_score, excluded_rows).get(song_id, [])
+
+    def top_k_many(self, song_ids, k: int = 10, min_score: float = 0.0) -> dict:
+        """top_k for several songs at once (one matrix-matrix product): {song_id: [(id, score), ...]}."""
+        return self.query(song_ids).top_k(k, min_score)
+
+    def similar_above(self, song_id: str, min_score: float) -> list:
+        """Every other song scoring above min_score against `song_id`, unordered: [(id, score), ...]."""
+        return self.query([song_id]).above(min_score).get(song_id, [])
+
+    def song_ids(self) -> list:
+        return list(self._row_of)
+
+    # --- Helper internal ---
+
+    def _write_metadata(self, row: int, song):
+        self._artist[row] = self._code(self._artist_codes, song.artist)
+        self._genre[row] = self._code(self._genre_codes, song.genre)
+        bucket = min(int(song.duration_seconds or 0) // 60, DURATION_BUCKETS - 1)
+        duration_block = np.zeros(DURATION_BUCKETS, dtype=np.float32)
+        duration_block[bucket] = DURATION_WEIGHT
+        self._dense[row, _DURATION_SLICE] = duration_block
+        self._refresh_norm(row)
+
+    def _refresh_context(self, row: int):
+        context = self._context[row]
+        norm = float(np.linalg.norm(context))
+        self._dense[row, _COOC_SLICE] = COOC_WEIGHT * context / norm if norm > 0 else 0.0
+        self._refresh_norm(row)
+
+    def _refresh_norm(self, row: int):
+        # Blok one-hot artis & genre selalu berisi tepat satu elemen
+        dense = self._dense[row]
+        self._norms[row] = np.sqrt(ARTIST_WEIGHT ** 2 + GENRE_WEIGHT ** 2 + float(dense @ dense))
+
+    @staticmethod
+    def _index_vector(song_id: str):
+        # Deterministik dari ID: tidak perlu disimpan, sama di setiap sesi
+        rng = np.random.default_rng(zlib.crc32(song_id.encode("utf-8")))
+        vector = np.zeros(COOC_DIM, dtype=np.float32)
+        positions = rng.choice(COOC_DIM, COOC_NONZERO, replace=False)
+        vector[positions] = rng.choice((-1.0, 1.0), COOC_NONZERO)
+        return vector
+
+    @staticmethod
+    def _code(dictionary: dict, value) -> int:
+        key = field_key(value)
+        code = dictionary.get(key)
+        if code is None:
+            code = len(dictionary)
+            dictionary[key] = code
+        return code
+
+    def _grow(self):
+        old = self._capacity
+        self._capacity *= 2
+        self._artist = np.concatenate([self._artist, np.full(old, -1, dtype=np.int32)])
+        self._genre = np.concatenate([self._genre, np.full(old, -1, dtype=np.int32)])
+        self._dense = np.concatenate([self._dense, np.zeros((old, DENSE_DIM), dtype=np.float32)])
+        self._context = np.concatenate([self._context, np.zeros((old, COOC_DIM), dtype=np.float32)])
+        self._norms = np.concatenate([self._norms, np.ones(old, dtype=np.float32)])
+        self._alive = np.concatenate([self._alive, np.zeros(old, dtype=bool)])
+
+
+class ScoreQuery:
+    """
+    Cosine scores of some songs against the whole store, captured from a
+    SimilarityEngine so the matrix products can run without the lock that
+    guards the engine.
+
+    Capturing copies the queried rows, the alive mask and the row -> ID list,
+    and keeps views of the big arrays (growing the engine replaces them, so a
+    view stays valid). Rows written while the query runs may be scored on
+    either value, and a row freed or reused meanwhile is reported under the
+    ID it had at capture time; callers re-check IDs before using the result.
+    """
+
+    def __init__(self, engine: SimilarityEngine, song_ids):
+        self.song_ids = [song_id for song_id in song_ids if song_id in engine._row_of]
+        size = engine._size
+        self._rows = np.array([engine._row_of[song_id] for song_id in self.song_ids], dtype=np.intp)
+        self._query_dense = engine._dense[self._rows].copy()
+        self._query_artist = engine._artist[self._rows].copy()
+        self._query_genre = engine._genre[self._rows].copy()
+        self._query_norms = engine._norms[self._rows].copy()
+        self._dense = engine._dense[:size]
+        self._artist = engine._artist[:size]
+        self._genre = engine._genre[:size]
+        self._norms = engine._norms[:size]
+        self._alive = engine._alive[:size].copy()
+        self._ids = engine._ids[:size]
+
+    def top_k(self, k: int, min_score: float = 0.0, excluded_rows=()) -> dict:
+        """{song_id: [(id, score), ...]} of the k best scores above min_score, best first."""
+        if not self.song_ids or k <= 0:
+            return {}
+        block = self._scores()
+        if excluded_rows:
+            block[:, excluded_rows] = -np.inf
+        return {song_id: self._best(scores, k, min_score) for song_id, scores in zip(self.song_ids, block)}
+
+    def above(self, min_score: float) -> dict:
+        """{song_id: [(id, score), ...]} of every other song scoring above min_score, unordered."""
+        if not self.song_ids:
+            return {}
+        return {song_id: [(self._ids[r], float(scores[r])) for r in np.flatnonzero(scores > min_score)]
+                for song_id, scores in zip(self.song_ids, self._scores())}
+
+    def _scores(self):
+        """Scores of the queried rows against every row; dead rows and each row itself get -inf."""
+        dots = self._query_dense @ self._dense.T
+        dots += (ARTIST_WEIGHT ** 2) * (self._query_artist[:, None] == self._artist[None, :])
+        dots += (GENRE_WEIGHT ** 2) * (self._query_genre[:, None] == self._genre[None, :])
+        scores = dots / (self._query_norms[:, None] * self._norms[None, :])
+        scores[:, ~self._alive] = -np.inf
+        scores[np.arange(len(self._rows)), self._rows] = -np.inf
+        return scores
+
+    def _best(self, scores, k: int, min_score: float) -> list:
+        k = min(k, len(scores))
+        top_rows = np.argpartition(-scores, k - 1)[:k]
+        top_rows = top_rows[np.argsort(-scores[top_rows], kind='stable')]
+        return [(self._ids[r], float(scores[r])) for r in top_rows if scores[r] > min_score]
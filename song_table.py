@@ -0,0 +1,127 @@
+"""
+Columnar Song Table
+Array-backed mirror of the song library so the query planner can filter a
+large candidate list by genre or duration with vectorised masks instead of
+one Python test per song.
+"""
+
+from search_index import field_key
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+
+class SongTable:
+    """
+    Column store over the library.
+
+    Every song gets an integer row. Durations and genre codes live in NumPy
+    arrays, so a predicate over a candidate list is one gather and one
+    comparison. Deleted rows are tombstoned and reclaimed by `compact()`.
+    The Song objects themselves are still what callers get back.
+
+    Predicates that can be answered from the columns implement
+    `column_mask(table, rows)` (see query_parser); `filter` combines them.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._capacity = capacity
+        self._size = 0
+        self._row_of = {}  # song_id -> row
+        self._songs = []  # row -> Song (None jika sudah dihapus)
+
+        self._durations = np.zeros(capacity, dtype=np.float64)
+        self._genre_codes = np.full(capacity, -1, dtype=np.int32)
+
+        self._genre_dict = {}  # field_key(genre) -> kode
+        self._dead_rows = 0
+
+    def __len__(self):
+        return self._size - self._dead_rows
+
+    # --- Mutasi ---
+    def add(self, song):
+        if song.song_id in self._row_of:
+            self.update(song)
+            return
+        if self._size == self._capacity:
+            self._grow()
+        row = self._size
+        self._size += 1
+        self._row_of[song.song_id] = row
+        self._songs.append(song)
+        self._write_row(row, song)
+
+    def update(self, song):
+        row = self._row_of.get(song.song_id)
+        if row is None:
+            self.add(song)
+            return
+        self._write_row(row, song)
+
+    def remove(self, song_id: str):
+        row = self._row_of.pop(song_id, None)
+        if row is None:
+            return
+        self._songs[row] = None
+        self._genre_codes[row] = -1
+        self._dead_rows += 1
+        if self._dead_rows > 1024 and self._dead_rows * 2 > self._size:
+            self.compact()
+
+    def compact(self):
+        """Drop tombstoned rows and renumber the remaining ones."""
+        live_songs = [song for song in self._songs if song is not None]
+        self.__init__(max(1024, len(live_songs) * 2))
+        for song in live_songs:
+            self.add(song)
+
+    # --- Query ---
+    def filter(self, songs: list, predicates) -> list:
+        """The songs (order kept) that pass every predicate's column_mask."""
+        if not songs:
+            return songs
+        row_of = self._row_of
+        rows = np.fromiter((row_of[song.song_id] for song in songs), dtype=np.intp, count=len(songs))
+        keep = np.ones(len(rows), dtype=bool)
+        for predicate in predicates:
+            keep &= predicate.column_mask(self, rows)
+        return [songs[i] for i in np.flatnonzero(keep)]
+
+    def genre_mask(self, rows, genre: str):
+        code = self._genre_dict.get(field_key(genre))
+        if code is None:
+            return np.zeros(len(rows), dtype=bool)
+        return self._genre_codes[rows] == code
+
+    def duration_mask(self, rows, low=None, high=None, include_low=True, include_high=True):
+        durations = self._durations[rows]
+        mask = np.ones(len(rows), dtype=bool)
+        if low is not None:
+            mask &= (durations >= low) if include_low else (durations > low)
+        if high is not None:
+            mask &= (durations <= high) if include_high else (durations < high)
+        return mask
+
+    # --- Helper internal ---
+    def _write_row(self, row: int, song):
+        self._durations[row] = song.duration_seconds or 0
+        self._genre_codes[row] = self._code(self._genre_dict, song.genre)
+
+    @staticmethod
+    def _code(dictionary: dict, value) -> int:
+        key = field_key(value)
+        code = dictionary.get(key)
+        if code is None:
+            code = len(dictionary)
+            dictionary[key] = code
+        return code
+
+    def _grow(self):
+        self._capacity *= 2
+        self._durations = np.resize(self._durations, self._capacity)
+        self._genre_codes = np.resize(self._genre_codes, self._capacity)
@@ -0,0 +1,606 @@
+"""
+Persistence Layer for MusicPlayer
+Pluggable storage backends: snapshot + append-only journal (JSON), a
+debounced write-behind JSON snapshot, and an indexed SQLite database. All of
+them accept the same mutation records.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_USERNAME = "Mokhammad Bahauddin"
+FAVOURITES_NAME = "My Favourites"
+
+
+def empty_data() -> dict:
+    """Return an empty data dictionary in the music_data.json layout."""
+    return {'username': DEFAULT_USERNAME, 'songs': {}, 'playlists': {}}
+
+
+def apply_record(data: dict, record: dict):
+    """
+    Apply one journal record to a data dictionary (music_data.json layout).
+    Unknown operations are ignored so older builds can read newer journals.
+    """
+    op = record.get('op')
+    songs = data.setdefault('songs', {})
+    playlists = data.setdefault('playlists', {})
+
+    if op == 'set_username':
+        data['username'] = record['name']
+    elif op == 'add_song':
+        songs[record['song_id']] = dict(record['details'])
+    elif op == 'update_song':
+        details = songs.get(record['song_id'])
+        if details is not None:
+            details.update(record['details'])
+    elif op == 'delete_song':
+        song_id = record['song_id']
+        songs.pop(song_id, None)
+        data.get('play_counts', {}).pop(song_id, None)
+        for name, song_ids in playlists.items():
+            playlists[name] = [sid for sid in song_ids if sid != song_id]
+    elif op == 'create_playlist':
+        playlists.setdefault(record['name'], [])
+    elif op == 'delete_playlist':
+        playlists.pop(record['name'], None)
+    elif op == 'playlist_add':
+        playlists.setdefault(record['name'], []).append(record['song_id'])
+    elif op == 'playlist_remove':
+        song_ids = playlists.get(record['name'], [])
+        if record['song_id'] in song_ids:
+            song_ids.remove(record['song_id'])
+    elif op == 'playlist_move':
+        song_ids = playlists.get(record['name'], [])
+        if 0 <= record['from_index'] < len(song_ids):
+            song_ids.insert(record['to_index'], song_ids.pop(record['from_index']))
+    elif op == 'play':
+        play_counts = data.setdefault('play_counts', {})
+        play_counts[record['song_id']] = play_counts.get(record['song_id'], 0) + 1
+
+
+def write_json_atomic(path: str, data: dict, indent=4):
+    """Write JSON to a temp file and swap it in, so readers never see a half-written file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=indent)
+    os.replace(tmp_path, path)
+
+
+def read_json_lines(path: str) -> list:
+    """Every entry of a JSON-lines file ([] if it does not exist)."""
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Baris terakhir bisa terpotong jika aplikasi crash saat menulis
+                continue
+    return entries
+
+
+def append_json_lines(path: str, entries: list):
+    """Append entries to a JSON-lines file with a single write."""
+    with open(path, 'a') as f:
+        f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+
+
+def rewrite_json_lines(path: str, entries: list):
+    """Replace a JSON-lines file atomically (used to drop entries a snapshot now covers)."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+    os.replace(tmp_path, path)
+
+
+class BackgroundCompaction:
+    """
+    Runs one snapshot-and-trim job at a time on a daemon thread, for the
+    snapshot + log schemes (JournalStorage, PlayHistory). Errors are printed
+    with `error_label`, never raised into the caller.
+    """
+
+    def __init__(self, error_label: str):
+        self.error_label = error_label
+        self._thread = None
+
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, job):
+        def run():
+            try:
+                job()
+            except Exception as e:
+                print(f"{self.error_label}: {e}")
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def join(self):
+        """Wait for a running job to finish."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class JournalStorage:
+    """
+    Write-ahead journal storage.
+
+    The snapshot (music_data.json) keeps the familiar layout plus a
+    'journal_seq' marker. Every mutation appends one JSON line to the journal;
+    loading replays the snapshot and then every journal record newer than the
+    marker. Once the journal grows past `compact_threshold` records it is folded
+    into a fresh snapshot on a background thread.
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: str = None, compact_threshold: int = 500):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal"
+        self.compact_threshold = compact_threshold
+
+        self._lock = threading.Lock()
+        self._seq = 0  # Nomor record terakhir yang ditulis
+        self._pending = 0  # Jumlah record sejak snapshot terakhir
+        self._snapshot_provider = None
+        self._compaction = BackgroundCompaction("Error kompaksi journal")
+
+    def attach(self, snapshot_provider):
+        """Register a callable returning the current in-memory data dictionary."""
+        self._snapshot_provider = snapshot_provider
+
+    def load(self) -> dict:
+        """Read the snapshot and replay the journal on top of it."""
+        data = empty_data()
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as f:
+                data.update(json.load(f))
+        snapshot_seq = data.pop('journal_seq', 0)
+        self._seq = snapshot_seq
+        self._pending = 0
+
+        for record in read_json_lines(self.journal_path):
+            if record.get('seq', 0) <= snapshot_seq:
+                continue
+            apply_record(data, record)
+            self._seq = record['seq']
+            self._pending += 1
+        return data
+
+    def record(self, op: str, **payload):
+        """Append a single mutation record to the journal."""
+        self.record_many([dict(payload, op=op)])
+
+    def record_many(self, records: list):
+        """Append several mutation records with a single file write."""
+        if not records:
+            return
+        with self._lock:
+            numbered = []
+            for record in records:
+                self._seq += 1
+                numbered.append(dict(record, seq=self._seq))
+            append_json_lines(self.journal_path, numbered)
+            self._pending += len(records)
+            should_compact = self._pending >= self.compact_threshold
+        if should_compact:
+            self.compact_async()
+
+    def save(self, data: dict):
+        """Write a full snapshot now and discard the journal it covers."""
+        self.join()
+        with self._lock:
+            write_json_atomic(self.snapshot_path, dict(data, journal_seq=self._seq))
+            self._trim_journal(self._seq)
+            self._pending = 0
+
+    def compact_async(self):
+        """Fold the journal into a new snapshot on a background thread."""
+        if self._snapshot_provider is None or self._compaction.running():
+            return
+
+        # Snapshot diambil di thread pemanggil, tanpa memegang self._lock: provider mengambil
+        # state lock pemain, sedangkan mutasi memanggil record_many sambil memegang state lock.
+        # Snapshot cocok dengan seq jika tidak ada record baru selama dibuat; jika ada, ulangi.
+        while True:
+            seq = self._seq
+            data = self._snapshot_provider()
+            with self._lock:
+                if self._seq == seq:
+                    self._pending = 0
+                    break
+
+        def run_compaction():
+            # Penulisan snapshot (bagian lambat) berjalan tanpa memegang lock
+            write_json_atomic(self.snapshot_path, dict(data, journal_seq=seq))
+            with self._lock:
+                self._trim_journal(seq)
+
+        self._compaction.start(run_compaction)
+
+    def join(self):
+        """Wait for a running compaction to finish."""
+        self._compaction.join()
+
+    def flush(self):
+        """Journal records are appended synchronously; only a running compaction can be pending."""
+        self.join()
+
+    def close(self):
+        self.join()
+
+    def _trim_journal(self, seq: int):
+        """Drop journal records already covered by the snapshot. Caller holds the lock."""
+        rewrite_json_lines(self.journal_path,
+                           [r for r in read_json_lines(self.journal_path) if r.get('seq', 0) > seq])
+
+
+class WriteBehindSaver:
+    """
+    Debounced background writer.
+
+    `mark_dirty()` is cheap and never touches the disk. A daemon thread waits
+    until no new change has arrived for `quiet_period` seconds and then calls
+    `write_fn` once, so a burst of mutations costs a single write. `flush()`
+    writes pending changes synchronously (used on shutdown).
+    """
+
+    def __init__(self, write_fn, quiet_period: float = 1.0):
+        self.write_fn = write_fn
+        self.quiet_period = quiet_period
+
+        self._cond = threading.Condition()
+        self._dirty = False
+        self._writing = False
+        self._stopped = False
+        self._last_change = 0.0
+        self._thread = None
+
+    def mark_dirty(self):
+        with self._cond:
+            self._dirty = True
+            self._last_change = time.monotonic()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def flush(self):
+        """Write pending changes now, waiting for an in-flight write first."""
+        with self._cond:
+            while self._writing:
+                self._cond.wait()
+            if not self._dirty:
+                return
+            self._dirty = False
+            self._writing = True
+        self._write()
+
+    def stop(self):
+        """Flush and stop the background thread."""
+        self.flush()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+
+                # Tunggu sampai tidak ada perubahan baru selama quiet_period
+                while self._dirty and not self._stopped:
+                    remaining = self._last_change + self.quiet_period - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                if self._stopped or not self._dirty or self._writing:
+                    continue
+                self._dirty = False
+                self._writing = True
+            self._write()
+
+    def _write(self):
+        try:
+            self.write_fn()
+        except Exception as e:
+            print(f"Error menyimpan data: {e}")
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+class SnapshotStorage:
+    """
+    Whole-file JSON snapshot (music_data.json) written behind the UI.
+
+    Mutation records only mark the model dirty; a WriteBehindSaver coalesces
+    them into one atomic write (temp file + os.replace) after a quiet period.
+    """
+
+    def __init__(self, snapshot_path: str, quiet_period: float = 1.0):
+        self.snapshot_path = snapshot_path
+        self._snapshot_provider = None
+        self._saver = WriteBehindSaver(self._write_current, quiet_period)
+
+    def attach(self, snapshot_provider):
+        self._snapshot_provider = snapshot_provider
+
+    def load(self) -> dict:
+        data = empty_data()
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as f:
+                data.update(json.load(f))
+        data.pop('journal_seq', None)
+        return data
+
+    def record(self, op: str, **payload):
+        self._saver.mark_dirty()
+
+    def record_many(self, records: list):
+        if records:
+            self._saver.mark_dirty()
+
+    def save(self, data: dict):
+        write_json_atomic(self.snapshot_path, data)
+
+    def flush(self):
+        self._saver.flush()
+
+    def close(self):
+        self._saver.stop()
+
+    def _write_current(self):
+        if self._snapshot_provider is not None:
+            write_json_atomic(self.snapshot_path, self._snapshot_provider())
+
+
+class SqliteStorage:
+    """
+    SQLite storage backend (stdlib sqlite3).
+
+    Songs, playlists and playlist positions live in indexed tables that are
+    updated one record at a time, so a mutation never rewrites the whole file.
+    The player reads the whole database at startup and answers its own queries
+    from in-memory indexes; lookups by ID, genre, artist and playlist
+    membership are also answered here by the database, for callers that do not
+    need the full model. If the database is empty and a legacy music_data.json
+    exists, it is imported once on first load.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS songs (
+            song_id TEXT PRIMARY KEY,
+            title TEXT,
+            artist TEXT,
+            album TEXT,
+            genre TEXT,
+            duration_seconds INTEGER,
+            file_path TEXT,
+            image_path TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_songs_genre ON songs (genre COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS idx_songs_artist ON songs (artist COLLATE NOCASE);
+        CREATE TABLE IF NOT EXISTS playlists (
+            name TEXT PRIMARY KEY
+        );
+        CREATE TABLE IF NOT EXISTS playlist_songs (
+            playlist TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            song_id TEXT NOT NULL,
+            PRIMARY KEY (playlist, position)
+        );
+        CREATE INDEX IF NOT EXISTS idx_playlist_songs_song ON playlist_songs (song_id);
+        CREATE TABLE IF NOT EXISTS play_counts (
+            song_id TEXT PRIMARY KEY,
+            play_count INTEGER NOT NULL
+        );
+    """
+
+    SONG_COLUMNS = ('title', 'artist', 'album', 'genre', 'duration_seconds', 'file_path', 'image_path')
+
+    def __init__(self, db_path: str, json_path: str = None):
+        self.db_path = db_path
+        self.json_path = json_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(self.SCHEMA)
+
+    def attach(self, snapshot_provider):
+        """SQLite writes every record in place, so no snapshot provider is needed."""
+        pass
+
+    def load(self) -> dict:
+        """Read the whole database into the music_data.json layout."""
+        if self._needs_migration():
+            self.migrate_from_json(self.json_path)
+
+        data = empty_data()
+        username = self._get_meta('username')
+        if username is not None:
+            data['username'] = username
+
+        columns = ", ".join(self.SONG_COLUMNS)
+        for row in self.conn.execute(f"SELECT song_id, {columns} FROM songs ORDER BY rowid"):
+            data['songs'][row[0]] = dict(zip(self.SONG_COLUMNS, row[1:]))
+
+        for (name,) in self.conn.execute("SELECT name FROM playlists ORDER BY rowid"):
+            data['playlists'][name] = self.playlist_song_ids(name)
+        data['play_counts'] = dict(self.conn.execute("SELECT song_id, play_count FROM play_counts"))
+        return data
+
+    def migrate_from_json(self, json_path: str):
+        """One-shot import of a music_data.json snapshot (and its journal) into the database."""
+        data = JournalStorage(json_path).load()
+        self.save(data)
+        with self.conn:
+            self._set_meta('migrated_from', json_path)
+        print(f"Data lama '{json_path}' berhasil dimigrasi ke '{self.db_path}'.")
+
+    def record(self, op: str, **payload):
+        self.record_many([dict(payload, op=op)])
+
+    def record_many(self, records: list):
+        """Apply mutation records inside one transaction."""
+        with self.conn:
+            for record in records:
+                self._apply(record)
+
+    def save(self, data: dict):
+        """Replace the database contents with a full data dictionary."""
+        with self.conn:
+            self.conn.execute("DELETE FROM playlist_songs")
+            self.conn.execute("DELETE FROM playlists")
+            self.conn.execute("DELETE FROM songs")
+            self.conn.execute("DELETE FROM play_counts")
+            self._set_meta('username', data.get('username', DEFAULT_USERNAME))
+            for song_id, details in data.get('songs', {}).items():
+                self._insert_song(song_id, details)
+            for name, song_ids in data.get('playlists', {}).items():
+                self.conn.execute("INSERT INTO playlists (name) VALUES (?)", (name,))
+                self.conn.executemany(
+                    "INSERT INTO playlist_songs (playlist, position, song_id) VALUES (?, ?, ?)",
+                    [(name, position, song_id) for position, song_id in enumerate(song_ids)])
+            self.conn.executemany("INSERT INTO play_counts (song_id, play_count) VALUES (?, ?)",
+                                  data.get('play_counts', {}).items())
+
+    def flush(self):
+        """Every record is committed in its own transaction, nothing is pending."""
+        pass
+
+    def close(self):
+        self.conn.close()
+
+    # --- Query terindeks ---
+    def get_song_details(self, song_id: str):
+        columns = ", ".join(self.SONG_COLUMNS)
+        row = self.conn.execute(f"SELECT {columns} FROM songs WHERE song_id = ?", (song_id,)).fetchone()
+        return dict(zip(self.SONG_COLUMNS, row)) if row else None
+
+    def song_ids_by_genre(self, genre: str) -> list:
+        rows = self.conn.execute("SELECT song_id FROM songs WHERE genre = ? COLLATE NOCASE ORDER BY rowid", (genre,))
+        return [row[0] for row in rows]
+
+    def song_ids_by_artist(self, artist: str) -> list:
+        rows = self.conn.execute("SELECT song_id FROM songs WHERE artist = ? COLLATE NOCASE ORDER BY rowid", (artist,))
+        return [row[0] for row in rows]
+
+    def playlist_song_ids(self, name: str) -> list:
+        rows = self.conn.execute("SELECT song_id FROM playlist_songs WHERE playlist = ? ORDER BY position", (name,))
+        return [row[0] for row in rows]
+
+    def playlists_containing(self, song_id: str) -> list:
+        rows = self.conn.execute("SELECT DISTINCT playlist FROM playlist_songs WHERE song_id = ?", (song_id,))
+        return [row[0] for row in rows]
+
+    # --- Helper internal ---
+    def _needs_migration(self) -> bool:
+        if not self.json_path or not os.path.exists(self.json_path):
+            return False
+        if self._get_meta('migrated_from') is not None:
+            return False
+        return self.conn.execute("SELECT 1 FROM songs LIMIT 1").fetchone() is None
+
+    def _get_meta(self, key: str):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _insert_song(self, song_id: str, details: dict):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO songs (song_id, title, artist, album, genre, duration_seconds, "
+            "file_path, image_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (song_id,) + tuple(details.get(column) for column in self.SONG_COLUMNS))
+
+    def _apply(self, record: dict):
+        op = record.get('op')
+        if op == 'set_username':
+            self._set_meta('username', record['name'])
+        elif op == 'add_song':
+            self._insert_song(record['song_id'], record['details'])
+        elif op == 'update_song':
+            details = {k: v for k, v in record['details'].items() if k in self.SONG_COLUMNS}
+            if details:
+                assignments = ", ".join(f"{column} = ?" for column in details)
+                self.conn.execute(f"UPDATE songs SET {assignments} WHERE song_id = ?",
+                                  tuple(details.values()) + (record['song_id'],))
+        elif op == 'delete_song':
+            self.conn.execute("DELETE FROM playlist_songs WHERE song_id = ?", (record['song_id'],))
+            self.conn.execute("DELETE FROM play_counts WHERE song_id = ?", (record['song_id'],))
+            self.conn.execute("DELETE FROM songs WHERE song_id = ?", (record['song_id'],))
+        elif op == 'create_playlist':
+            self.conn.execute("INSERT OR IGNORE INTO playlists (name) VALUES (?)", (record['name'],))
+        elif op == 'delete_playlist':
+            self.conn.execute("DELETE FROM playlist_songs WHERE playlist = ?", (record['name'],))
+            self.conn.execute("DELETE FROM playlists WHERE name = ?", (record['name'],))
+        elif op == 'playlist_add':
+            self.conn.execute("INSERT OR IGNORE INTO playlists (name) VALUES (?)", (record['name'],))
+            self.conn.execute(
+                "INSERT INTO playlist_songs (playlist, position, song_id) "
+                "SELECT ?, COALESCE(MAX(position), -1) + 1, ? FROM playlist_songs WHERE playlist = ?",
+                (record['name'], record['song_id'], record['name']))
+        elif op == 'playlist_remove':
+            self.conn.execute(
+                "DELETE FROM playlist_songs WHERE rowid = (SELECT rowid FROM playlist_songs "
+                "WHERE playlist = ? AND song_id = ? ORDER BY position LIMIT 1)",
+                (record['name'], record['song_id']))
+        elif op == 'playlist_move':
+            # Posisi bisa berlubang setelah hapus, jadi urutan playlist ini ditulis ulang
+            song_ids = self.playlist_song_ids(record['name'])
+            if 0 <= record['from_index'] < len(song_ids):
+                song_ids.insert(record['to_index'], song_ids.pop(record['from_index']))
+                self.conn.execute("DELETE FROM playlist_songs WHERE playlist = ?", (record['name'],))
+                self.conn.executemany(
+                    "INSERT INTO playlist_songs (playlist, position, song_id) VALUES (?, ?, ?)",
+                    [(record['name'], position, song_id) for position, song_id in enumerate(song_ids)])
+        elif op == 'play':
+            self.conn.execute(
+                "INSERT INTO play_counts (song_id, play_count) VALUES (?, 1) "
+                "ON CONFLICT (song_id) DO UPDATE SET play_count = play_count + 1",
+                (record['song_id'],))
+
+
+def storage_dir(storage) -> str:
+    """Folder holding a storage backend's file, for data that belongs next to it ('' = working directory)."""
+    path = getattr(storage, 'snapshot_path', None) or getattr(storage, 'db_path', None) or ''
+    return os.path.dirname(path)
+
+
+def create_storage(backend: str, data_file: str, **options):
+    """
+    Build a storage backend by name.
+    'journal' keeps music_data.json (+ journal); 'json' rewrites music_data.json
+    through the write-behind saver; 'sqlite' uses music_data.db and migrates an
+    existing music_data.json on first start.
+    """
+    if backend == 'journal':
+        return JournalStorage(data_file, **options)
+    if backend == 'json':
+        return SnapshotStorage(data_file, **options)
+    if backend == 'sqlite':
+        db_path = os.path.splitext(data_file)[0] + ".db"
+        return SqliteStorage(db_path, json_path=data_file)
+    raise ValueError(f"Storage backend tidak dikenal: {backend}")
@@ -35,6 +35,9 @@ class VisualizerEngine:
         self.peak_values = np.zeros(self.num_bars)
         self.peak_decay_rate = 0.95
 
+        # Playback position source (seconds); falls back to the mixer's get_pos()
+        self.position_source = None
+
         # Frequency bands (bass, mid, treble)
         self.band_ranges = {
             'bass': (0, 8),  # 0-250 Hz
@@ -99,7 +102,10 @@ class VisualizerEngine:
 
         # Get playback position (for animation sync)
         try:
-            pos = pygame.mixer.music.get_pos() / 1000.0  # Convert to seconds
+            if self.position_source is not None:
+                pos = self.position_source()
+            else:
+                pos = pygame.mixer.music.get_pos() / 1000.0  # Convert to seconds
         except:
             pos = time.time()
 
@@ -159,6 +165,10 @@ class VisualizerEngine:
         with self.data_lock:
             return np.mean(self.spectrum_data[start:end])
 
+    def set_position_source(self, source):
+        """Use `source()` (seconds into the track) as the playback position for animation sync."""
+        self.position_source = source
+
     def set_smoothing(self, factor: float):
         """Adjust smoothing factor (0.0 - 1.0)."""
         self.smoothing_factor = max(0.0, min(1.0, factor))